@@ -1,19 +1,25 @@
+import asyncio
+
 from fastapi import FastAPI
 from mangum import Mangum
-import sys
-import os
 
-# Add the parent directory to Python path for module imports
-current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(current_dir)
-sys.path.insert(0, parent_dir)
+# Mangum runs the app on the default asyncio loop; make that loop uvloop.
+# uvloop is not available on Windows, where the stock loop is kept.
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
 
+# The project root is on PYTHONPATH via vercel.json, so main imports directly
 try:
     # Import the FastAPI app
     from main import app
     
-    # Create the handler for Vercel using Mangum
-    handler = Mangum(app)
+    # Create the handler for Vercel using Mangum. Mangum runs lifespan startup and
+    # shutdown around every invocation, which would close the connection pools after
+    # each request, so the lifespan only runs under uvicorn.
+    handler = Mangum(app, lifespan="off")
 except Exception as e:
     # Fallback FastAPI app in case main import fails
     print(f"Failed to import main app: {e}")
@@ -3,14 +3,15 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from supabase import Client
+from supabase import AsyncClient
 import os
 from typing import Optional
 
-from app.database import get_current_supabase
+from app.database import get_current_async_supabase
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (cost resolved once at import; existing hashes verify at any cost)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -54,7 +55,7 @@ def verify_token(token: str) -> dict:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get the current authenticated user"""
     token = credentials.credentials
@@ -68,9 +69,10 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get user from Supabase
+    # Get user from Supabase. Not cached: is_active and password_hash must be
+    # current on every instance, not just the one that handled the last write
     try:
-        response = supabase.table("users").select("*").eq("id", user_id).execute()
+        response = await supabase.table("users").select("*").eq("id", user_id).execute()
         if not response.data:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
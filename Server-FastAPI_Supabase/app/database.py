@@ -1,39 +1,81 @@
-from supabase import create_client, Client
+from supabase import create_client, acreate_client, Client, AsyncClient, ClientOptions, AsyncClientOptions
 from functools import lru_cache
+import asyncio
+import httpx
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
+from app.utils.storage_async import close_client as close_storage_client
+
+# Vercel injects configuration into the environment; .env files are for local runs
+if not os.getenv("VERCEL"):
+    load_dotenv()
+
+# Read once at import; the environment does not change while the process runs
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
+SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+# Per-client pool size. On Vercel every warm instance holds its own pool, so keep
+# instances x SUPABASE_MAX_CONNECTIONS under the project's connection limit.
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 25))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", 10))
+# Must stay below keepalive_expiry so pooled connections never go idle long enough to be dropped
+KEEPALIVE_PING_INTERVAL = 25
+
+_keepalive_task = None
+_async_client = None
+_async_client_lock = asyncio.Lock()
+# httpx pools handed to supabase-py, closed on shutdown
+_http_clients = []
+
+def _pool_limits() -> httpx.Limits:
+    """Connection pool limits shared by the sync and async clients"""
+    return httpx.Limits(
+        max_connections=SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+        keepalive_expiry=30
+    )
+
+# A caller-supplied httpx client keeps its own timeout (the *_client_timeout
+# options only apply to clients supabase-py builds itself), so set it here;
+# writes get longer for storage uploads.
+_HTTP_TIMEOUT = httpx.Timeout(10.0, write=20.0)
+
+def _client_options() -> ClientOptions:
+    """Client options with a keep-alive HTTP/2 connection pool, reused for the life of the process"""
+    http_client = httpx.Client(http2=True, limits=_pool_limits(), timeout=_HTTP_TIMEOUT)
+    _http_clients.append(http_client)
+    return ClientOptions(
+        postgrest_client_timeout=10,
+        storage_client_timeout=20,
+        httpx_client=http_client
+    )
+
+def _require_config(key_name: str, key: str) -> None:
+    """Raise if the Supabase URL or the given key is not configured"""
+    if not SUPABASE_URL:
+        raise ValueError("SUPABASE_URL environment variable is not set")
+    if not key:
+        raise ValueError(f"{key_name} environment variable is not set")
 
 @lru_cache()
 def get_supabase_client() -> Client:
     """Create and return a Supabase client instance"""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_ANON_KEY")
-    
-    if not url:
-        raise ValueError("SUPABASE_URL environment variable is not set")
-    if not key:
-        raise ValueError("SUPABASE_ANON_KEY environment variable is not set")
+    _require_config("SUPABASE_ANON_KEY", SUPABASE_ANON_KEY)
     
     try:
-        return create_client(url, key)
+        return create_client(SUPABASE_URL, SUPABASE_ANON_KEY, options=_client_options())
     except Exception as e:
         raise ValueError(f"Failed to create Supabase client: {str(e)}")
 
 @lru_cache()
 def get_supabase_admin_client() -> Client:
     """Create and return a Supabase admin client instance with service role key"""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    
-    if not url:
-        raise ValueError("SUPABASE_URL environment variable is not set")
-    if not key:
-        raise ValueError("SUPABASE_SERVICE_ROLE_KEY environment variable is not set")
+    _require_config("SUPABASE_SERVICE_ROLE_KEY", SUPABASE_SERVICE_ROLE_KEY)
     
     try:
-        return create_client(url, key)
+        return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, options=_client_options())
     except Exception as e:
         raise ValueError(f"Failed to create Supabase admin client: {str(e)}")
 
@@ -41,19 +83,65 @@ def get_current_supabase() -> Client:
     """Dependency to get Supabase client"""
     return get_supabase_client()
 
-# Test function to validate configuration
-def test_supabase_connection():
-    """Test the Supabase connection without caching"""
-    try:
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_ANON_KEY")
-        
-        if not url or not key:
-            return False, "Missing environment variables"
-            
-        client = create_client(url, key)
-        # Try a simple query
-        response = client.table("users").select("id").limit(1).execute()
-        return True, "Connection successful"
-    except Exception as e:
-        return False, f"Connection failed: {str(e)}"
\ No newline at end of file
+async def get_async_supabase_client() -> AsyncClient:
+    """Create (once) and return the async Supabase client used by non-blocking routes"""
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+    
+    _require_config("SUPABASE_ANON_KEY", SUPABASE_ANON_KEY)
+    
+    # Concurrent first requests must not each build (and leak) a client and pool
+    async with _async_client_lock:
+        if _async_client is None:
+            http_client = httpx.AsyncClient(http2=True, limits=_pool_limits(), timeout=_HTTP_TIMEOUT)
+            _http_clients.append(http_client)
+            try:
+                _async_client = await acreate_client(SUPABASE_URL, SUPABASE_ANON_KEY, options=AsyncClientOptions(
+                    postgrest_client_timeout=10,
+                    storage_client_timeout=20,
+                    httpx_client=http_client
+                ))
+            except Exception as e:
+                raise ValueError(f"Failed to create async Supabase client: {str(e)}")
+    return _async_client
+
+async def get_current_async_supabase() -> AsyncClient:
+    """Dependency to get the async Supabase client"""
+    return await get_async_supabase_client()
+
+def ping_supabase() -> None:
+    """Run the cheapest possible REST query on the shared client; raises on failure"""
+    get_supabase_client().table("products").select("id", head=True).limit(1).execute()
+
+async def _keepalive_loop():
+    while True:
+        await asyncio.sleep(KEEPALIVE_PING_INTERVAL)
+        try:
+            await asyncio.to_thread(ping_supabase)
+        except Exception:
+            pass
+
+def start_keepalive() -> None:
+    """Start the background ping that keeps pooled connections warm (idempotent)"""
+    global _keepalive_task
+    if _keepalive_task is None or _keepalive_task.done():
+        _keepalive_task = asyncio.get_running_loop().create_task(_keepalive_loop())
+
+async def close_supabase_clients() -> None:
+    """Stop the keepalive ping and close every pooled connection (shutdown hook)"""
+    global _async_client
+    if _keepalive_task is not None:
+        _keepalive_task.cancel()
+    
+    while _http_clients:
+        http_client = _http_clients.pop()
+        if isinstance(http_client, httpx.AsyncClient):
+            await http_client.aclose()
+        else:
+            http_client.close()
+    await close_storage_client()
+    
+    _async_client = None
+    get_supabase_client.cache_clear()
+    get_supabase_admin_client.cache_clear()
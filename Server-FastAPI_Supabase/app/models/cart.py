@@ -1,34 +1,23 @@
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, PositiveInt
 from typing import Optional
 from datetime import datetime
-from decimal import Decimal
 
 class CartItemBase(BaseModel):
     product_id: str
     quantity: int
 
 class CartItemCreate(CartItemBase):
-    @validator('quantity')
-    def validate_quantity(cls, v):
-        if v <= 0:
-            raise ValueError('Quantity must be greater than 0')
-        return v
+    quantity: PositiveInt
 
 class CartItemUpdate(BaseModel):
-    quantity: int
-    
-    @validator('quantity')
-    def validate_quantity(cls, v):
-        if v <= 0:
-            raise ValueError('Quantity must be greater than 0')
-        return v
+    quantity: PositiveInt
 
 class CartItemResponse(CartItemBase):
     id: str
     user_id: str
     product_name: str
-    product_price: Decimal
-    total_price: Decimal
+    product_price: float
+    total_price: float
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -37,5 +26,5 @@ class CartItemResponse(CartItemBase):
 
 class CartResponse(BaseModel):
     items: list[CartItemResponse]
-    total_amount: Decimal
+    total_amount: float
     total_items: int
\ No newline at end of file
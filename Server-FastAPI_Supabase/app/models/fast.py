@@ -0,0 +1,26 @@
+"""
+msgspec mirrors of response models for high-throughput read endpoints
+
+These are only used to serialize rows already stored in the database; request
+bodies are still validated with the Pydantic models.
+"""
+import msgspec
+from typing import Optional
+from datetime import datetime
+from decimal import Decimal
+
+class ProductFast(msgspec.Struct, kw_only=True):
+    """Mirror of ProductResponse (same fields in the same order, same JSON output)"""
+    name: str
+    description: str
+    price: Decimal
+    category: str
+    stock_quantity: int
+    image_url: Optional[str] = None
+    is_active: bool = True
+    is_featured: bool = False
+    id: str
+    rating: Optional[float] = 0.0
+    review_count: Optional[int] = 0
+    created_at: datetime
+    updated_at: Optional[datetime] = None
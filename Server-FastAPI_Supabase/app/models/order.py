@@ -1,5 +1,5 @@
-from pydantic import BaseModel, validator
-from typing import Optional, List
+from pydantic import AliasChoices, BaseModel, Field, PositiveInt
+from typing import Any, Dict, Optional, List, Union
 from datetime import datetime
 from decimal import Decimal
 from enum import Enum
@@ -17,11 +17,7 @@ class OrderItemBase(BaseModel):
     unit_price: Decimal
 
 class OrderItemCreate(OrderItemBase):
-    @validator('quantity')
-    def validate_quantity(cls, v):
-        if v <= 0:
-            raise ValueError('Quantity must be greater than 0')
-        return v
+    quantity: PositiveInt
 
 class OrderItemResponse(OrderItemBase):
     id: str
@@ -37,13 +33,19 @@ class OrderBase(BaseModel):
     notes: Optional[str] = None
 
 class OrderCreate(OrderBase):
-    items: List[OrderItemCreate]
-    
-    @validator('items')
-    def validate_items(cls, v):
-        if not v:
-            raise ValueError('Order must contain at least one item')
-        return v
+    items: List[OrderItemCreate] = Field(min_length=1)
+
+class OrderItemRequest(BaseModel):
+    # The storefront sends cart items, which may carry the product id as "id"
+    product_id: str = Field(validation_alias=AliasChoices('product_id', 'id'))
+    quantity: PositiveInt = 1
+
+class OrderCreateRequest(BaseModel):
+    """Body of POST /orders; prices are taken from the database, not the client"""
+    items: List[OrderItemRequest] = Field(min_length=1)
+    shipping_address: Union[Dict[str, Any], str] = {}
+    payment_method: str = "cod"
+    notes: Optional[str] = None
 
 class OrderUpdate(BaseModel):
     status: Optional[OrderStatus] = None
@@ -60,4 +62,16 @@ class OrderResponse(OrderBase):
     items: List[OrderItemResponse] = []
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class OrderPagination(BaseModel):
+    page: int
+    limit: int
+    total_items: int
+    total_pages: int
+    has_next: bool
+    has_previous: bool
+
+class OrderListResponse(BaseModel):
+    orders: List[OrderResponse]
+    pagination: OrderPagination
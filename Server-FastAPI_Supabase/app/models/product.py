@@ -1,8 +1,10 @@
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, field_validator
 from typing import Optional, List
 from datetime import datetime
 from decimal import Decimal
 
+_VALID_RATINGS = frozenset({1, 2, 3, 4, 5})
+
 class ProductBase(BaseModel):
     name: str
     description: str
@@ -14,13 +16,15 @@ class ProductBase(BaseModel):
     is_featured: bool = False
 
 class ProductCreate(ProductBase):
-    @validator('price')
+    @field_validator('price', mode='after')
+    @classmethod
     def validate_price(cls, v):
         if v <= 0:
             raise ValueError('Price must be greater than 0')
         return v
     
-    @validator('stock_quantity')
+    @field_validator('stock_quantity', mode='after')
+    @classmethod
     def validate_stock(cls, v):
         if v < 0:
             raise ValueError('Stock quantity cannot be negative')
@@ -52,9 +56,10 @@ class ReviewBase(BaseModel):
     comment: str
 
 class ReviewCreate(ReviewBase):
-    @validator('rating')
+    @field_validator('rating', mode='after')
+    @classmethod
     def validate_rating(cls, v):
-        if v < 1 or v > 5:
+        if v not in _VALID_RATINGS:
             raise ValueError('Rating must be between 1 and 5')
         return v
 
@@ -62,9 +67,10 @@ class ReviewUpdate(BaseModel):
     rating: Optional[int] = None
     comment: Optional[str] = None
     
-    @validator('rating')
+    @field_validator('rating', mode='after')
+    @classmethod
     def validate_rating(cls, v):
-        if v is not None and (v < 1 or v > 5):
+        if v is not None and v not in _VALID_RATINGS:
             raise ValueError('Rating must be between 1 and 5')
         return v
 
@@ -1,8 +1,10 @@
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import datetime
 from decimal import Decimal
 
+_MIN_PASSWORD_LEN = 6
+
 class UserBase(BaseModel):
     email: EmailStr
     full_name: str  # Changed from 'name' to 'full_name' to match database
@@ -14,9 +16,10 @@ class UserCreate(UserBase):
     avatar: Optional[str] = None  # This will be base64 encoded image data or None
     address: Optional[str] = None  # Added address field for signup
     
-    @validator('password')
+    @field_validator('password', mode='after')
+    @classmethod
     def validate_password(cls, v):
-        if len(v) < 6:
+        if len(v) < _MIN_PASSWORD_LEN:
             raise ValueError('Password must be at least 6 characters long')
         return v
 
@@ -48,9 +51,10 @@ class ResetPassword(BaseModel):
     email: EmailStr
     new_password: str
     
-    @validator('new_password')
+    @field_validator('new_password', mode='after')
+    @classmethod
     def validate_password(cls, v):
-        if len(v) < 6:
+        if len(v) < _MIN_PASSWORD_LEN:
             raise ValueError('Password must be at least 6 characters long')
         return v
 
@@ -58,9 +62,10 @@ class ChangePassword(BaseModel):
     current_password: str
     new_password: str
     
-    @validator('new_password')
+    @field_validator('new_password', mode='after')
+    @classmethod
     def validate_password(cls, v):
-        if len(v) < 6:
+        if len(v) < _MIN_PASSWORD_LEN:
             raise ValueError('Password must be at least 6 characters long')
         return v
 
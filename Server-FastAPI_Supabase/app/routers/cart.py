@@ -1,61 +1,62 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from supabase import Client
+from fastapi.responses import Response
+from supabase import AsyncClient
+from postgrest.exceptions import APIError
 from typing import List
-import uuid
-from decimal import Decimal
+import asyncio
 
-from app.database import get_current_supabase
-from app.models.cart import CartItemCreate, CartItemUpdate, CartItemResponse, CartResponse
+from app.database import get_current_async_supabase
+from app.models.cart import CartItemCreate, CartItemUpdate, CartResponse
 from app.models.response import SuccessResponse
+from app.utils.responses import json_dumps
 from app.auth import get_current_user
 
 router = APIRouter()
 
-@router.get("/", response_model=CartResponse)
+# Columns read by get_cart (no whitespace, so postgrest-py has nothing to strip)
+_CART_SELECT = "id,user_id,product_id,quantity,created_at,updated_at,products(name,price)"
+
+# Returns a pre-encoded Response, so CartResponse only documents the schema
+@router.get("/", responses={200: {"model": CartResponse}})
 async def get_cart(
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get user's cart"""
     try:
         # Get cart items with product details
-        response = supabase.table("cart_items").select("""
-            *,
-            products (
-                name,
-                price,
-                stock_quantity,
-                image_url
-            )
-        """).eq("user_id", current_user["id"]).execute()
+        response = await supabase.table("cart_items").select(_CART_SELECT).eq("user_id", current_user["id"]).execute()
         
+        # Build the CartResponse-shaped payload directly (rows come from the database)
         cart_items = []
-        total_amount = Decimal('0')
+        total_amount = 0.0
         
         for item in response.data:
-            if item.get("products"):
-                product = item["products"]
-                item_total = Decimal(str(product["price"])) * item["quantity"]
+            product = item.get("products")
+            if product:
+                # Prices are sent as JSON numbers, matching the orders endpoints
+                product_price = float(product["price"])
+                item_total = round(product_price * item["quantity"], 2)
                 
-                cart_item = CartItemResponse(
-                    id=item["id"],
-                    user_id=item["user_id"],
-                    product_id=item["product_id"],
-                    quantity=item["quantity"],
-                    product_name=product["name"],
-                    product_price=Decimal(str(product["price"])),
-                    total_price=item_total,
-                    created_at=item["created_at"],
-                    updated_at=item.get("updated_at")
-                )
-                cart_items.append(cart_item)
+                cart_items.append({
+                    "product_id": item["product_id"],
+                    "quantity": item["quantity"],
+                    "id": item["id"],
+                    "user_id": item["user_id"],
+                    "product_name": product["name"],
+                    "product_price": product_price,
+                    "total_price": item_total,
+                    "created_at": item["created_at"],
+                    "updated_at": item.get("updated_at")
+                })
                 total_amount += item_total
         
-        return CartResponse(
-            items=cart_items,
-            total_amount=total_amount,
-            total_items=len(cart_items)
-        )
+        body = json_dumps({
+            "items": cart_items,
+            "total_amount": round(total_amount, 2),
+            "total_items": len(cart_items)
+        })
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
         raise HTTPException(
@@ -67,55 +68,21 @@ async def get_cart(
 async def add_to_cart(
     cart_item: CartItemCreate,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Add item to cart"""
     try:
-        # Check if product exists and has enough stock
-        product_response = supabase.table("products").select("*").eq("id", cart_item.product_id).eq("is_active", True).execute()
-        
-        if not product_response.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Product not found"
-            )
-        
-        product = product_response.data[0]
-        
-        if product["stock_quantity"] < cart_item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Insufficient stock"
-            )
-        
-        # Check if item already exists in cart
-        existing_item = supabase.table("cart_items").select("*").eq("user_id", current_user["id"]).eq("product_id", cart_item.product_id).execute()
-        
-        if existing_item.data:
-            # Update existing item quantity
-            new_quantity = existing_item.data[0]["quantity"] + cart_item.quantity
-            
-            if product["stock_quantity"] < new_quantity:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Insufficient stock for requested quantity"
-                )
-            
-            response = supabase.table("cart_items").update({
-                "quantity": new_quantity,
-                "updated_at": "now()"
-            }).eq("id", existing_item.data[0]["id"]).execute()
-        else:
-            # Create new cart item
-            cart_data = {
-                "id": str(uuid.uuid4()),
-                "user_id": current_user["id"],
-                "product_id": cart_item.product_id,
-                "quantity": cart_item.quantity,
-                "created_at": "now()"
-            }
-            
-            response = supabase.table("cart_items").insert(cart_data).execute()
+        try:
+            response = await supabase.rpc("add_to_cart", {
+                "p_user": current_user["id"],
+                "p_product": cart_item.product_id,
+                "p_qty": cart_item.quantity
+            }).execute()
+        except APIError as e:
+            # add_to_cart() raises PT404/PT400 for unknown products and insufficient stock
+            if e.code in ("PT404", "PT400"):
+                raise HTTPException(status_code=int(e.code[2:]), detail=e.message)
+            raise
         
         if not response.data:
             raise HTTPException(
@@ -125,7 +92,7 @@ async def add_to_cart(
         
         return SuccessResponse(
             message="Item added to cart successfully",
-            data=response.data[0]
+            data=response.data
         )
         
     except Exception as e:
@@ -139,22 +106,19 @@ async def add_to_cart(
 @router.put("/update/{product_id}", response_model=SuccessResponse)
 async def update_cart_item(
     product_id: str,
-    request: dict,
+    request: CartItemUpdate,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Update cart item quantity"""
     try:
-        quantity = request.get("quantity")
+        quantity = request.quantity
         
-        if not quantity or quantity < 1:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Quantity must be at least 1"
-            )
-        
-        # Get cart item
-        cart_response = supabase.table("cart_items").select("*").eq("product_id", product_id).eq("user_id", current_user["id"]).execute()
+        # Fetch the cart item and the product stock concurrently
+        cart_response, product_response = await asyncio.gather(
+            supabase.table("cart_items").select("id").eq("product_id", product_id).eq("user_id", current_user["id"]).execute(),
+            supabase.table("products").select("stock_quantity").eq("id", product_id).execute()
+        )
         
         if not cart_response.data:
             raise HTTPException(
@@ -164,9 +128,6 @@ async def update_cart_item(
         
         cart_item = cart_response.data[0]
         
-        # Check product stock
-        product_response = supabase.table("products").select("stock_quantity").eq("id", product_id).execute()
-        
         if not product_response.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -180,9 +141,8 @@ async def update_cart_item(
             )
         
         # Update cart item
-        response = supabase.table("cart_items").update({
-            "quantity": quantity,
-            "updated_at": "now()"
+        response = await supabase.table("cart_items").update({
+            "quantity": quantity
         }).eq("id", cart_item["id"]).execute()
         
         if not response.data:
@@ -208,11 +168,11 @@ async def update_cart_item(
 async def remove_from_cart(
     product_id: str,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Remove item from cart"""
     try:
-        response = supabase.table("cart_items").delete().eq("product_id", product_id).eq("user_id", current_user["id"]).execute()
+        response = await supabase.table("cart_items").delete().eq("product_id", product_id).eq("user_id", current_user["id"]).execute()
         
         if not response.data:
             raise HTTPException(
@@ -236,11 +196,11 @@ async def remove_from_cart(
 @router.delete("/clear", response_model=SuccessResponse)
 async def clear_cart(
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Clear all items from cart"""
     try:
-        response = supabase.table("cart_items").delete().eq("user_id", current_user["id"]).execute()
+        response = await supabase.table("cart_items").delete().eq("user_id", current_user["id"]).execute()
         
         return SuccessResponse(
             message="Cart cleared successfully",
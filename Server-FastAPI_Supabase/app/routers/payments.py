@@ -1,10 +1,14 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from supabase import Client
+from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi.responses import Response
+from supabase import AsyncClient
+from postgrest.exceptions import APIError
 from typing import Optional
-import uuid
+import hashlib
+import secrets
 
-from app.database import get_current_supabase
+from app.database import get_current_async_supabase
 from app.models.response import SuccessResponse
+from app.utils.responses import json_dumps
 from app.auth import get_current_user
 
 router = APIRouter()
@@ -13,7 +17,7 @@ router = APIRouter()
 async def create_payment_intent(
     payment_data: dict,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Create payment intent for order"""
     try:
@@ -31,19 +35,20 @@ async def create_payment_intent(
         # For demo purposes, we'll simulate payment intent creation
         # In production, you would integrate with actual payment gateways like Stripe, Razorpay, etc.
         
+        # One random draw covers the intent id and the client secret
+        token = secrets.token_hex(32)
         payment_intent = {
-            "id": f"pi_{uuid.uuid4().hex[:24]}",
+            "id": f"pi_{token[:24]}",
             "amount": amount,
             "currency": currency,
             "status": "requires_payment_method",
-            "client_secret": f"pi_{uuid.uuid4().hex[:24]}_secret_{uuid.uuid4().hex[:10]}",
+            "client_secret": f"pi_{token[24:48]}_secret_{token[48:58]}",
             "payment_method": payment_method,
-            "order_id": order_id,
-            "created_at": "now()"
+            "order_id": order_id
         }
         
         # Store payment intent in database
-        response = supabase.table("payment_intents").insert(payment_intent).execute()
+        response = await supabase.table("payment_intents").insert(payment_intent).execute()
         
         return SuccessResponse(
             message="Payment intent created successfully",
@@ -67,7 +72,7 @@ async def create_payment_intent(
 async def confirm_payment(
     payment_data: dict,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Confirm payment and update order status"""
     try:
@@ -81,56 +86,32 @@ async def confirm_payment(
                 detail="Payment intent ID is required"
             )
         
-        # Get payment intent
-        intent_response = supabase.table("payment_intents").select("*").eq("id", payment_intent_id).execute()
-        
-        if not intent_response.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Payment intent not found"
-            )
-        
-        # For demo purposes, simulate successful payment
-        # In production, you would verify the payment with the payment gateway
-        
-        payment_record = {
-            "id": str(uuid.uuid4()),
-            "user_id": current_user["id"],
-            "order_id": order_id,
-            "payment_intent_id": payment_intent_id,
-            "payment_method_id": payment_method_id,
-            "amount": intent_response.data[0]["amount"],
-            "currency": intent_response.data[0]["currency"],
-            "status": "succeeded",
-            "created_at": "now()"
-        }
-        
-        # Store payment record
-        payment_response = supabase.table("payments").insert(payment_record).execute()
-        
-        if not payment_response.data:
+        # Intent lookup, payment insert and the intent/order updates happen in
+        # the confirm_payment_tx() function (database_migrations.sql) in one transaction
+        try:
+            response = await supabase.rpc("confirm_payment_tx", {
+                "p_intent": payment_intent_id,
+                "p_method": payment_method_id,
+                # An empty order_id means no order to update, as before
+                "p_order": order_id or None,
+                "p_user": current_user["id"]
+            }).execute()
+        except APIError as e:
+            # confirm_payment_tx() raises PT404 for an unknown payment intent
+            if e.code == "PT404":
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.message)
+            raise
+        
+        if not response.data:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to record payment"
             )
         
-        # Update order status to confirmed
-        if order_id:
-            supabase.table("orders").update({
-                "status": "confirmed",
-                "payment_status": "paid",
-                "updated_at": "now()"
-            }).eq("id", order_id).execute()
-        
-        # Update payment intent status
-        supabase.table("payment_intents").update({
-            "status": "succeeded"
-        }).eq("id", payment_intent_id).execute()
-        
         return SuccessResponse(
             message="Payment confirmed successfully",
             data={
-                "payment_id": payment_record["id"],
+                "payment_id": response.data["id"],
                 "status": "succeeded",
                 "order_id": order_id
             }
@@ -144,49 +125,49 @@ async def confirm_payment(
             detail=f"Failed to confirm payment: {str(e)}"
         )
 
-@router.get("/methods", response_model=dict)
-async def get_payment_methods():
+# The method list is static, so its JSON body and ETag are built once at import
+_PAYMENT_METHODS = [
+    {
+        "id": "card",
+        "name": "Credit/Debit Card",
+        "icon": "credit-card",
+        "description": "Pay with your credit or debit card"
+    },
+    {
+        "id": "upi",
+        "name": "UPI",
+        "icon": "smartphone",
+        "description": "Pay with UPI apps like GPay, PhonePe, Paytm"
+    },
+    {
+        "id": "netbanking",
+        "name": "Net Banking",
+        "icon": "building-bank",
+        "description": "Pay directly from your bank account"
+    },
+    {
+        "id": "wallet",
+        "name": "Digital Wallet",
+        "icon": "wallet",
+        "description": "Pay with digital wallets"
+    },
+    {
+        "id": "cod",
+        "name": "Cash on Delivery",
+        "icon": "banknotes",
+        "description": "Pay when your order is delivered"
+    }
+]
+
+_PAYMENT_METHODS_BODY = json_dumps({"payment_methods": _PAYMENT_METHODS})
+_PAYMENT_METHODS_HEADERS = {
+    "Cache-Control": "public, max-age=86400",
+    "ETag": f'"{hashlib.md5(_PAYMENT_METHODS_BODY).hexdigest()}"'
+}
+
+@router.get("/methods")
+async def get_payment_methods(request: Request):
     """Get available payment methods"""
-    try:
-        payment_methods = [
-            {
-                "id": "card",
-                "name": "Credit/Debit Card",
-                "icon": "credit-card",
-                "description": "Pay with your credit or debit card"
-            },
-            {
-                "id": "upi",
-                "name": "UPI",
-                "icon": "smartphone",
-                "description": "Pay with UPI apps like GPay, PhonePe, Paytm"
-            },
-            {
-                "id": "netbanking",
-                "name": "Net Banking",
-                "icon": "building-bank",
-                "description": "Pay directly from your bank account"
-            },
-            {
-                "id": "wallet",
-                "name": "Digital Wallet",
-                "icon": "wallet",
-                "description": "Pay with digital wallets"
-            },
-            {
-                "id": "cod",
-                "name": "Cash on Delivery",
-                "icon": "banknotes",
-                "description": "Pay when your order is delivered"
-            }
-        ]
-        
-        return {
-            "payment_methods": payment_methods
-        }
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get payment methods: {str(e)}"
-        )
\ No newline at end of file
+    if request.headers.get("if-none-match") == _PAYMENT_METHODS_HEADERS["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_PAYMENT_METHODS_HEADERS)
+    return Response(content=_PAYMENT_METHODS_BODY, media_type="application/json", headers=_PAYMENT_METHODS_HEADERS)
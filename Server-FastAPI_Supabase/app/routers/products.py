@@ -1,17 +1,106 @@
+"""
+Product catalog and review routes
+
+Read endpoints are cached in-process (see app/utils/cache.py); on Vercel the
+caches only persist within a warm container.
+"""
 from fastapi import APIRouter, HTTPException, status, Depends, Query
-from supabase import Client
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from supabase import AsyncClient
+from postgrest.exceptions import APIError
+from postgrest.types import CountMethod, ReturnMethod
+from cachetools import TTLCache
+import msgspec
 from typing import List, Optional
 import uuid
-import math
+import base64
+from datetime import datetime
 
-from app.database import get_current_supabase
+from app.database import get_current_async_supabase
 from app.models.product import ProductCreate, ProductUpdate, ProductResponse, ReviewCreate, ReviewResponse
+from app.models.fast import ProductFast
 from app.models.response import SuccessResponse, PaginationResponse
 from app.auth import get_current_user, get_current_active_user
+from app.utils.cache import get_or_set
 
 router = APIRouter()
 
-@router.get("/", response_model=dict)
+# Postgres error code raised when an insert violates a unique constraint
+UNIQUE_VIOLATION = "23505"
+
+# Product rows returned by Supabase already conform to the `products` table
+# schema, so read endpoints build responses with `model_construct` and skip
+# validation. Write paths (ProductCreate/ProductUpdate) are still validated.
+
+# List serializers are compiled once at import and reused by every request.
+# Product listings go through msgspec (app/models/fast.py) straight to JSON bytes.
+_REVIEW_LIST_ADAPTER = TypeAdapter(List[ReviewResponse])
+_ENCODER = msgspec.json.Encoder()
+
+# Columns of the ProductResponse model, so product reads skip search_vec and rating_sum
+_PRODUCT_SELECT = ",".join(ProductResponse.model_fields)
+
+def _encode_products(payload: dict) -> bytes:
+    """Encode a payload whose "products" key holds raw product rows to JSON bytes"""
+    payload["products"] = msgspec.convert(payload["products"], List[ProductFast], strict=False)
+    return _ENCODER.encode(payload)
+
+def _json_response(content: bytes) -> Response:
+    """Wrap pre-encoded JSON bytes in a response"""
+    return Response(content=content, media_type="application/json")
+
+def _dump_reviews(rows: list, users: dict) -> list:
+    """Serialize trusted review rows, attaching user info from an id -> user map"""
+    reviews = []
+    for row in rows:
+        user = users.get(row.get("user_id")) or {}
+        reviews.append(ReviewResponse.model_construct(**{
+            **row,
+            "user_name": user.get("full_name"),
+            "user_avatar": user.get("avatar")
+        }))
+    return _REVIEW_LIST_ADAPTER.dump_python(reviews, mode="json", warnings=False)
+
+def _encode_cursor(row: dict) -> str:
+    """Encode a row's (created_at, id) position as an opaque keyset cursor"""
+    return base64.urlsafe_b64encode(f"{row['created_at']}|{row['id']}".encode()).decode()
+
+def _after_cursor(query, cursor: str):
+    """Filter a created_at DESC, id DESC query to rows strictly after the cursor"""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        created_at = datetime.fromisoformat(created_at).isoformat()
+        row_id = str(uuid.UUID(row_id))
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return query.or_(
+        f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})'
+    )
+
+# Short-lived caches for the hottest read endpoints, keyed by query parameters
+# (product listings are cached as encoded JSON bytes)
+_PRODUCTS_CACHE = TTLCache(maxsize=512, ttl=30)
+_FEATURED_CACHE = TTLCache(maxsize=8, ttl=60)
+_REVIEWS_CACHE = TTLCache(maxsize=1024, ttl=60)
+# Category counts are aggregated in Postgres and change rarely
+_CATEGORIES_CACHE = TTLCache(maxsize=1, ttl=300)
+
+def _invalidate_review_cache(product_id: str):
+    """Drop every cached review page of a product after a new review"""
+    for key in [key for key in _REVIEWS_CACHE if key[0] == product_id]:
+        _REVIEWS_CACHE.pop(key, None)
+
+def _invalidate_product_caches():
+    """Drop cached product listings after a catalog write"""
+    _PRODUCTS_CACHE.clear()
+    _FEATURED_CACHE.clear()
+    _CATEGORIES_CACHE.clear()
+
+@router.get("/", response_model=None)
 async def get_products(
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(12, ge=1, le=100, description="Number of products per page"),
@@ -20,23 +109,24 @@ async def get_products(
     min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
     max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
     sort_by: str = Query("name", description="Sort by: name, price_asc, price_desc, rating, newest"),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get all products with filters and pagination"""
-    try:
+    async def load_products():
         # Calculate offset
         offset = (page - 1) * limit
         
-        # Build base query
-        query = supabase.table("products").select("*", count="exact").eq("is_active", True)
+        # Build base query; searches go through the GIN-indexed search_products() RPC
+        if search:
+            query = supabase.rpc("search_products", {"q": search}, count="exact")
+        else:
+            query = supabase.table("products").select(_PRODUCT_SELECT, count="exact")
+        query = query.eq("is_active", True)
         
         # Apply filters
         if category:
             query = query.eq("category", category)
         
-        if search:
-            query = query.or_(f"name.ilike.%{search}%,description.ilike.%{search}%")
-        
         if min_price is not None:
             query = query.gte("price", min_price)
             
@@ -58,14 +148,14 @@ async def get_products(
         # Apply pagination
         query = query.range(offset, offset + limit - 1)
         
-        response = query.execute()
+        response = await query.execute()
         
         # Calculate pagination info
         total_items = response.count if hasattr(response, 'count') else len(response.data)
-        total_pages = math.ceil(total_items / limit) if total_items > 0 else 1
+        total_pages = -(-total_items // limit) if total_items > 0 else 1
         
-        return {
-            "products": [ProductResponse(**product) for product in response.data],
+        return _encode_products({
+            "products": response.data,
             "pagination": {
                 "page": page,
                 "limit": limit,
@@ -74,7 +164,11 @@ async def get_products(
                 "has_next": page < total_pages,
                 "has_previous": page > 1
             }
-        }
+        })
+    
+    try:
+        cache_key = (page, limit, category, search, min_price, max_price, sort_by)
+        return _json_response(await get_or_set(_PRODUCTS_CACHE, cache_key, load_products))
         
     except Exception as e:
         raise HTTPException(
@@ -82,16 +176,18 @@ async def get_products(
             detail=f"Failed to get products: {str(e)}"
         )
 
-@router.get("/featured", response_model=List[ProductResponse])
+@router.get("/featured", response_model=None)
 async def get_featured_products(
     limit: int = Query(8, ge=1, le=20, description="Number of featured products"),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get featured products"""
+    async def load_featured():
+        response = await supabase.table("products").select(_PRODUCT_SELECT).eq("is_active", True).eq("is_featured", True).limit(limit).execute()
+        return _ENCODER.encode(msgspec.convert(response.data, List[ProductFast], strict=False))
+    
     try:
-        response = supabase.table("products").select("*").eq("is_active", True).eq("is_featured", True).limit(limit).execute()
-        
-        return [ProductResponse(**product) for product in response.data]
+        return _json_response(await get_or_set(_FEATURED_CACHE, limit, load_featured))
         
     except Exception as e:
         raise HTTPException(
@@ -101,22 +197,16 @@ async def get_featured_products(
 
 @router.get("/categories", response_model=dict)
 async def get_categories(
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get all unique product categories with counts"""
+    async def load_categories():
+        # Aggregated by the product_category_counts() function (database_migrations.sql)
+        response = await supabase.rpc("product_category_counts").execute()
+        return {"categories": response.data}
+    
     try:
-        response = supabase.table("products").select("category").eq("is_active", True).execute()
-        
-        # Count categories
-        category_counts = {}
-        for product in response.data:
-            category = product.get("category")
-            if category:
-                category_counts[category] = category_counts.get(category, 0) + 1
-        
-        categories = [{"name": cat, "count": count} for cat, count in sorted(category_counts.items())]
-        
-        return {"categories": categories}
+        return await get_or_set(_CATEGORIES_CACHE, "categories", load_categories)
         
     except Exception as e:
         raise HTTPException(
@@ -127,11 +217,11 @@ async def get_categories(
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: str,
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get a specific product by ID"""
     try:
-        response = supabase.table("products").select("*").eq("id", product_id).eq("is_active", True).execute()
+        response = await supabase.table("products").select(_PRODUCT_SELECT).eq("id", product_id).eq("is_active", True).execute()
         
         if not response.data:
             raise HTTPException(
@@ -139,7 +229,7 @@ async def get_product(
                 detail="Product not found"
             )
         
-        return ProductResponse(**response.data[0])
+        return ProductResponse.model_construct(**response.data[0])
         
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -149,41 +239,68 @@ async def get_product(
             detail=f"Failed to get product: {str(e)}"
         )
 
-@router.get("/{product_id}/reviews", response_model=dict)
+@router.get("/{product_id}/reviews", response_model=None)
 async def get_product_reviews(
     product_id: str,
     page: int = Query(1, ge=1, description="Page number"),
     limit: int = Query(10, ge=1, le=50, description="Number of reviews per page"),
-    supabase: Client = Depends(get_current_supabase)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor (overrides page)"),
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get reviews for a specific product"""
-    try:
-        offset = (page - 1) * limit
-        
-        # Get reviews with user info
-        query = supabase.table("reviews").select("*, users!inner(full_name, avatar)").eq("product_id", product_id)
-        query = query.order("created_at", desc=True).range(offset, offset + limit - 1)
-        
-        response = query.execute()
-        
-        # Get total count
-        count_response = supabase.table("reviews").select("id", count="exact").eq("product_id", product_id).execute()
-        total_items = count_response.count if hasattr(count_response, 'count') else len(count_response.data)
-        total_pages = math.ceil(total_items / limit) if total_items > 0 else 1
-        
-        return {
-            "reviews": response.data,
-            "pagination": {
+    async def load_reviews():
+        # Get reviews newest first; the page-based path counts in the same request
+        if cursor:
+            query = supabase.table("reviews").select("*").eq("product_id", product_id)
+            query = _after_cursor(query, cursor)
+            query = query.order("created_at", desc=True).order("id", desc=True).limit(limit)
+        else:
+            offset = (page - 1) * limit
+            query = supabase.table("reviews").select("*", count="exact").eq("product_id", product_id)
+            query = query.order("created_at", desc=True).order("id", desc=True).range(offset, offset + limit - 1)
+        
+        response = await query.execute()
+        
+        # Get the reviewers' info in one batched lookup
+        users = {}
+        user_ids = list({review["user_id"] for review in response.data})
+        if user_ids:
+            users_response = await supabase.table("users").select("id,full_name,avatar").in_("id", user_ids).execute()
+            users = {user["id"]: user for user in users_response.data}
+        
+        next_cursor = _encode_cursor(response.data[-1]) if len(response.data) == limit else None
+        
+        if cursor:
+            pagination = {
+                "limit": limit,
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None
+            }
+        else:
+            total_items = response.count if response.count is not None else len(response.data)
+            total_pages = -(-total_items // limit) if total_items > 0 else 1
+            pagination = {
                 "page": page,
                 "limit": limit,
                 "total_items": total_items,
                 "total_pages": total_pages,
                 "has_next": page < total_pages,
-                "has_previous": page > 1
+                "has_previous": page > 1,
+                "next_cursor": next_cursor if page < total_pages else None
             }
+        
+        return {
+            "reviews": _dump_reviews(response.data, users),
+            "pagination": pagination
         }
+    
+    try:
+        cache_key = (product_id, page, limit, cursor)
+        return await get_or_set(_REVIEWS_CACHE, cache_key, load_reviews)
         
     except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get product reviews: {str(e)}"
@@ -194,46 +311,35 @@ async def add_product_review(
     product_id: str,
     review: ReviewCreate,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Add a review for a product"""
     try:
-        # Check if product exists
-        product_response = supabase.table("products").select("id").eq("id", product_id).eq("is_active", True).execute()
-        if not product_response.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Product not found"
-            )
-        
-        # Check if user already reviewed this product
-        existing_review = supabase.table("reviews").select("id").eq("product_id", product_id).eq("user_id", current_user["id"]).execute()
-        if existing_review.data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="You have already reviewed this product"
-            )
-        
-        # Create review
-        review_data = {
-            "id": str(uuid.uuid4()),
-            "product_id": product_id,
-            "user_id": current_user["id"],
-            "rating": review.rating,
-            "comment": review.comment,
-            "created_at": "now()"
-        }
-        
-        response = supabase.table("reviews").insert(review_data).execute()
+        # The add_review() RPC (database_migrations.sql) checks the product, inserts
+        # the review and refreshes the product rating in a single round trip.
+        # One review per user and product is enforced by uq_reviews_user_product.
+        try:
+            response = await supabase.rpc("add_review", {
+                "p_id": product_id,
+                "u_id": current_user["id"],
+                "p_rating": review.rating,
+                "p_comment": review.comment
+            }).execute()
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="You have already reviewed this product"
+                )
+            raise
         
         if not response.data:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to add review"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
             )
         
-        # Update product rating
-        await update_product_rating(product_id, supabase)
+        _invalidate_review_cache(product_id)
         
         return SuccessResponse(
             message="Review added successfully",
@@ -248,47 +354,33 @@ async def add_product_review(
             detail=f"Failed to add review: {str(e)}"
         )
 
-async def update_product_rating(product_id: str, supabase: Client):
-    """Update product average rating"""
-    try:
-        # Get all reviews for the product
-        reviews_response = supabase.table("reviews").select("rating").eq("product_id", product_id).execute()
-        
-        if reviews_response.data:
-            ratings = [review["rating"] for review in reviews_response.data]
-            average_rating = sum(ratings) / len(ratings)
-            
-            # Update product rating
-            supabase.table("products").update({
-                "rating": round(average_rating, 1),
-                "review_count": len(ratings)
-            }).eq("id", product_id).execute()
-    except Exception:
-        # Don't fail the main operation if rating update fails
-        pass
-
 @router.post("/", response_model=SuccessResponse)
 async def create_product(
     product: ProductCreate,
     current_user: dict = Depends(get_current_active_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Create a new product (admin only)"""
     try:
         product_data = product.dict()
         product_data["id"] = str(uuid.uuid4())
         
-        response = supabase.table("products").insert(product_data).execute()
+        # Writes ask PostgREST for return=minimal; the response echoes what was stored
+        response = await supabase.table("products").insert(
+            product_data, count=CountMethod.exact, returning=ReturnMethod.minimal
+        ).execute()
         
-        if not response.data:
+        if not response.count:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to create product"
             )
         
+        _invalidate_product_caches()
+        
         return SuccessResponse(
             message="Product created successfully",
-            data=response.data[0]
+            data=product_data
         )
         
     except Exception as e:
@@ -304,7 +396,7 @@ async def update_product(
     product_id: str,
     product_update: ProductUpdate,
     current_user: dict = Depends(get_current_active_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Update a product (admin only)"""
     try:
@@ -316,17 +408,21 @@ async def update_product(
                 detail="No data to update"
             )
         
-        response = supabase.table("products").update(update_data).eq("id", product_id).execute()
+        response = await supabase.table("products").update(
+            update_data, count=CountMethod.exact, returning=ReturnMethod.minimal
+        ).eq("id", product_id).execute()
         
-        if not response.data:
+        if not response.count:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found or failed to update"
             )
         
+        _invalidate_product_caches()
+        
         return SuccessResponse(
             message="Product updated successfully",
-            data=response.data[0]
+            data={"id": product_id, **update_data}
         )
         
     except Exception as e:
@@ -341,18 +437,22 @@ async def update_product(
 async def delete_product(
     product_id: str,
     current_user: dict = Depends(get_current_active_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Delete a product (admin only) - soft delete by setting is_active to False"""
     try:
-        response = supabase.table("products").update({"is_active": False}).eq("id", product_id).execute()
+        response = await supabase.table("products").update(
+            {"is_active": False}, count=CountMethod.exact, returning=ReturnMethod.minimal
+        ).eq("id", product_id).execute()
         
-        if not response.data:
+        if not response.count:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found"
             )
         
+        _invalidate_product_caches()
+        
         return SuccessResponse(
             message="Product deleted successfully",
             data={"product_id": product_id}
@@ -366,103 +466,97 @@ async def delete_product(
             detail=f"Failed to delete product: {str(e)}"
         )
 
+# Sample catalog for /sample-data, built once at import; ids are assigned per call
+_SAMPLE_PRODUCTS = (
+    {
+        "name": "Wireless Headphones",
+        "description": "Premium wireless headphones with noise cancellation",
+        "price": 2999.99,
+        "category": "Electronics",
+        "stock_quantity": 50,
+        "image_url": "https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=500",
+        "is_active": True,
+        "is_featured": True
+    },
+    {
+        "name": "Gaming Laptop",
+        "description": "High-performance gaming laptop with RTX graphics",
+        "price": 89999.99,
+        "category": "Electronics",
+        "stock_quantity": 25,
+        "image_url": "https://images.unsplash.com/photo-1603302576837-37561b2e2302?w=500",
+        "is_active": True,
+        "is_featured": True
+    },
+    {
+        "name": "Cotton T-Shirt",
+        "description": "100% cotton comfortable t-shirt",
+        "price": 799.99,
+        "category": "Clothing",
+        "stock_quantity": 100,
+        "image_url": "https://images.unsplash.com/photo-1521572163474-6864f9cf17ab?w=500",
+        "is_active": True,
+        "is_featured": False
+    },
+    {
+        "name": "Running Shoes",
+        "description": "Comfortable running shoes for daily workouts",
+        "price": 4999.99,
+        "category": "Sports",
+        "stock_quantity": 75,
+        "image_url": "https://images.unsplash.com/photo-1542291026-7eec264c27ff?w=500",
+        "is_active": True,
+        "is_featured": True
+    },
+    {
+        "name": "Coffee Mug",
+        "description": "Ceramic coffee mug perfect for morning coffee",
+        "price": 299.99,
+        "category": "Home & Garden",
+        "stock_quantity": 200,
+        "image_url": "https://images.unsplash.com/photo-1544787219-7f47ccb76574?w=500",
+        "is_active": True,
+        "is_featured": False
+    },
+    {
+        "name": "Smartphone",
+        "description": "Latest flagship smartphone with advanced camera",
+        "price": 69999.99,
+        "category": "Electronics",
+        "stock_quantity": 40,
+        "image_url": "https://images.unsplash.com/photo-1511707171634-5f897ff02aa9?w=500",
+        "is_active": True,
+        "is_featured": True
+    }
+)
+_SAMPLE_CATEGORIES = sorted({p["category"] for p in _SAMPLE_PRODUCTS})
+
 # Add sample products endpoint for testing
 @router.post("/sample-data", response_model=SuccessResponse)
 async def create_sample_products(
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Create sample products for testing (development only)"""
     try:
-        # Sample products data
-        sample_products = [
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Wireless Headphones",
-                "description": "Premium wireless headphones with noise cancellation",
-                "price": 2999.99,
-                "category": "Electronics",
-                "stock_quantity": 50,
-                "image_url": "https://images.unsplash.com/photo-1505740420928-5e560c06d30e?w=500",
-                "is_active": True,
-                "is_featured": True,
-                "created_at": "now()"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Gaming Laptop",
-                "description": "High-performance gaming laptop with RTX graphics",
-                "price": 89999.99,
-                "category": "Electronics",
-                "stock_quantity": 25,
-                "image_url": "https://images.unsplash.com/photo-1603302576837-37561b2e2302?w=500",
-                "is_active": True,
-                "is_featured": True,
-                "created_at": "now()"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Cotton T-Shirt",
-                "description": "100% cotton comfortable t-shirt",
-                "price": 799.99,
-                "category": "Clothing",
-                "stock_quantity": 100,
-                "image_url": "https://images.unsplash.com/photo-1521572163474-6864f9cf17ab?w=500",
-                "is_active": True,
-                "is_featured": False,
-                "created_at": "now()"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Running Shoes",
-                "description": "Comfortable running shoes for daily workouts",
-                "price": 4999.99,
-                "category": "Sports",
-                "stock_quantity": 75,
-                "image_url": "https://images.unsplash.com/photo-1542291026-7eec264c27ff?w=500",
-                "is_active": True,
-                "is_featured": True,
-                "created_at": "now()"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Coffee Mug",
-                "description": "Ceramic coffee mug perfect for morning coffee",
-                "price": 299.99,
-                "category": "Home & Garden",
-                "stock_quantity": 200,
-                "image_url": "https://images.unsplash.com/photo-1544787219-7f47ccb76574?w=500",
-                "is_active": True,
-                "is_featured": False,
-                "created_at": "now()"
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Smartphone",
-                "description": "Latest flagship smartphone with advanced camera",
-                "price": 69999.99,
-                "category": "Electronics",
-                "stock_quantity": 40,
-                "image_url": "https://images.unsplash.com/photo-1511707171634-5f897ff02aa9?w=500",
-                "is_active": True,
-                "is_featured": True,
-                "created_at": "now()"
-            }
-        ]
-        
-        # Insert sample products
-        response = supabase.table("products").insert(sample_products).execute()
+        # Insert sample products (ids come from the column default); only the
+        # inserted row count is sent back
+        response = await supabase.table("products").insert(
+            list(_SAMPLE_PRODUCTS), count=CountMethod.exact, returning=ReturnMethod.minimal
+        ).execute()
         
-        if not response.data:
+        if not response.count:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to create sample products"
             )
         
+        _invalidate_product_caches()
+        
         return SuccessResponse(
-            message=f"Created {len(sample_products)} sample products successfully",
+            message=f"Created {len(_SAMPLE_PRODUCTS)} sample products successfully",
             data={
-                "products_created": len(response.data),
-                "categories": list(set([p["category"] for p in sample_products]))
+                "products_created": response.count,
+                "categories": _SAMPLE_CATEGORIES
             }
         )
         
@@ -1,29 +1,38 @@
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form
-from supabase import Client
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Query
+from fastapi.responses import Response
+from supabase import AsyncClient
+from postgrest.exceptions import APIError
 from typing import List, Optional
-import uuid
+import asyncio
 
-from app.database import get_current_supabase
+from app.database import get_current_async_supabase
 from app.models.user import UserResponse, UserUpdate, ChangePassword, AddressCreate, AddressUpdate, Address
 from app.models.response import SuccessResponse
 from app.auth import get_current_user, get_password_hash, verify_password
 from app.utils.storage import storage_manager
+from app.utils.responses import json_dumps
 
 router = APIRouter()
 
+# Columns of the Address response model, in field order
+_ADDRESS_SELECT = ",".join(Address.model_fields)
+
+# Wishlist rows with the product fields a product card needs (no description text)
+_WISHLIST_SELECT = "id,created_at,products!inner(id,name,price,image_url,category,stock_quantity,rating,review_count,is_active)"
+
 @router.get("/profile", response_model=UserResponse)
 async def get_current_user_profile(
     current_user: dict = Depends(get_current_user)
 ):
     """Get current user profile"""
-    user_data = {k: v for k, v in current_user.items() if k != "password"}
-    return UserResponse(**user_data)
+    # UserResponse ignores unknown keys, so password_hash never reaches the response
+    return UserResponse.model_validate(current_user)
 
 @router.put("/profile", response_model=SuccessResponse)
 async def update_current_user_profile(
     user_update: UserUpdate,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Update current user profile"""
     try:
@@ -35,9 +44,7 @@ async def update_current_user_profile(
                 detail="No data to update"
             )
         
-        update_data["updated_at"] = "now()"
-        
-        response = supabase.table("users").update(update_data).eq("id", current_user["id"]).execute()
+        response = await supabase.table("users").update(update_data).eq("id", current_user["id"]).execute()
         
         if not response.data:
             raise HTTPException(
@@ -47,7 +54,7 @@ async def update_current_user_profile(
         
         return SuccessResponse(
             message="Profile updated successfully",
-            data={k: v for k, v in response.data[0].items() if k != "password"}
+            data=UserResponse.model_validate(response.data[0])
         )
         
     except Exception as e:
@@ -62,24 +69,23 @@ async def update_current_user_profile(
 async def change_password(
     password_data: ChangePassword,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Change user password"""
     try:
-        # Verify current password
-        if not verify_password(password_data.current_password, current_user["password"]):
+        # bcrypt is CPU-bound, so verify and hash off the event loop
+        if not await asyncio.to_thread(verify_password, password_data.current_password, current_user["password_hash"]):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect"
             )
         
         # Hash new password
-        new_password_hash = get_password_hash(password_data.new_password)
+        new_password_hash = await asyncio.to_thread(get_password_hash, password_data.new_password)
         
         # Update password in database
-        response = supabase.table("users").update({
-            "password": new_password_hash,
-            "updated_at": "now()"
+        response = await supabase.table("users").update({
+            "password_hash": new_password_hash
         }).eq("id", current_user["id"]).execute()
         
         if not response.data:
@@ -101,16 +107,21 @@ async def change_password(
         )
 
 # Address Management
-@router.get("/addresses", response_model=List[Address])
+# Returns a pre-encoded Response, so List[Address] only documents the schema
+@router.get("/addresses", responses={200: {"model": List[Address]}})
 async def get_user_addresses(
+    limit: int = Query(50, ge=1, le=200, description="Number of addresses to return"),
+    offset: int = Query(0, ge=0, description="Number of addresses to skip"),
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get all addresses for current user"""
     try:
-        response = supabase.table("addresses").select("*").eq("user_id", current_user["id"]).order("is_default", desc=True).execute()
+        # Selecting exactly the Address fields lets the rows be encoded as-is, without a model per row
+        response = await supabase.table("addresses").select(_ADDRESS_SELECT).eq("user_id", current_user["id"]).order("is_default", desc=True).order("id").range(offset, offset + limit - 1).execute()
         
-        return [Address(**address) for address in response.data]
+        body = json_dumps(response.data)
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
         raise HTTPException(
@@ -122,22 +133,15 @@ async def get_user_addresses(
 async def add_address(
     address: AddressCreate,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Add a new address for current user"""
     try:
-        # If this is set as default, unset other defaults
-        if address.is_default:
-            supabase.table("addresses").update({"is_default": False}).eq("user_id", current_user["id"]).execute()
-        
-        address_data = address.dict()
-        address_data.update({
-            "id": str(uuid.uuid4()),
-            "user_id": current_user["id"],
-            "created_at": "now()"
-        })
-        
-        response = supabase.table("addresses").insert(address_data).execute()
+        # add_address() clears the user's other defaults (if needed) and inserts in one transaction
+        response = await supabase.rpc("add_address", {
+            "p_user": current_user["id"],
+            "p_address": address.dict()
+        }).execute()
         
         if not response.data:
             raise HTTPException(
@@ -147,7 +151,7 @@ async def add_address(
         
         return SuccessResponse(
             message="Address added successfully",
-            data=response.data[0]
+            data=response.data
         )
         
     except Exception as e:
@@ -163,19 +167,10 @@ async def update_address(
     address_id: str,
     address_update: AddressUpdate,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Update an address"""
     try:
-        # Check if address belongs to user
-        existing_address = supabase.table("addresses").select("*").eq("id", address_id).eq("user_id", current_user["id"]).execute()
-        
-        if not existing_address.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Address not found"
-            )
-        
         update_data = address_update.dict(exclude_unset=True)
         
         if not update_data:
@@ -184,20 +179,19 @@ async def update_address(
                 detail="No data to update"
             )
         
-        # If this is set as default, unset other defaults
-        if update_data.get("is_default"):
-            supabase.table("addresses").update({"is_default": False}).eq("user_id", current_user["id"]).execute()
-        
-        update_data["updated_at"] = "now()"
-        
-        response = supabase.table("addresses").update(update_data).eq("id", address_id).execute()
+        # Filtering on user_id doubles as the ownership check: no row back means not found
+        response = await supabase.table("addresses").update(update_data).eq("id", address_id).eq("user_id", current_user["id"]).execute()
         
         if not response.data:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to update address"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Address not found"
             )
         
+        # If this is set as default, unset the user's other defaults
+        if update_data.get("is_default"):
+            await supabase.table("addresses").update({"is_default": False}).eq("user_id", current_user["id"]).neq("id", address_id).execute()
+        
         return SuccessResponse(
             message="Address updated successfully",
             data=response.data[0]
@@ -215,21 +209,19 @@ async def update_address(
 async def delete_address(
     address_id: str,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Delete an address"""
     try:
-        # Check if address belongs to user
-        existing_address = supabase.table("addresses").select("*").eq("id", address_id).eq("user_id", current_user["id"]).execute()
+        # Filtering on user_id doubles as the ownership check: no row back means not found
+        response = await supabase.table("addresses").delete().eq("id", address_id).eq("user_id", current_user["id"]).execute()
         
-        if not existing_address.data:
+        if not response.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Address not found"
             )
         
-        response = supabase.table("addresses").delete().eq("id", address_id).execute()
-        
         return SuccessResponse(
             message="Address deleted successfully",
             data={"address_id": address_id}
@@ -244,14 +236,17 @@ async def delete_address(
         )
 
 # Wishlist Management
-@router.get("/wishlist", response_model=dict)
+@router.get("/wishlist")
 async def get_wishlist(
+    limit: int = Query(50, ge=1, le=200, description="Number of items to return"),
+    offset: int = Query(0, ge=0, description="Number of items to skip"),
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Get user's wishlist"""
     try:
-        response = supabase.table("wishlist").select("*, products!inner(*)").eq("user_id", current_user["id"]).execute()
+        # Newest first; id breaks ties so pages stay stable
+        response = await supabase.table("wishlist").select(_WISHLIST_SELECT, count="exact").eq("user_id", current_user["id"]).order("created_at", desc=True).order("id", desc=True).range(offset, offset + limit - 1).execute()
         
         wishlist_items = []
         for item in response.data:
@@ -262,10 +257,13 @@ async def get_wishlist(
                 "added_at": item["created_at"]
             })
         
-        return {
+        body = json_dumps({
             "items": wishlist_items,
-            "total": len(wishlist_items)
-        }
+            "total": response.count if response.count is not None else len(wishlist_items),
+            "limit": limit,
+            "offset": offset
+        })
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
         raise HTTPException(
@@ -277,7 +275,7 @@ async def get_wishlist(
 async def add_to_wishlist(
     request: dict,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Add product to wishlist"""
     try:
@@ -289,31 +287,16 @@ async def add_to_wishlist(
                 detail="Product ID is required"
             )
         
-        # Check if product exists
-        product_response = supabase.table("products").select("id").eq("id", product_id).eq("is_active", True).execute()
-        if not product_response.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Product not found"
-            )
-        
-        # Check if already in wishlist
-        existing_item = supabase.table("wishlist").select("id").eq("user_id", current_user["id"]).eq("product_id", product_id).execute()
-        if existing_item.data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Product already in wishlist"
-            )
-        
-        # Add to wishlist
-        wishlist_data = {
-            "id": str(uuid.uuid4()),
-            "user_id": current_user["id"],
-            "product_id": product_id,
-            "created_at": "now()"
-        }
-        
-        response = supabase.table("wishlist").insert(wishlist_data).execute()
+        try:
+            response = await supabase.rpc("wishlist_add_if_absent", {
+                "p_user": current_user["id"],
+                "p_product": product_id
+            }).execute()
+        except APIError as e:
+            # wishlist_add_if_absent() raises PT404/PT400 for unknown products and duplicates
+            if e.code in ("PT404", "PT400"):
+                raise HTTPException(status_code=int(e.code[2:]), detail=e.message)
+            raise
         
         if not response.data:
             raise HTTPException(
@@ -323,7 +306,7 @@ async def add_to_wishlist(
         
         return SuccessResponse(
             message="Product added to wishlist",
-            data=response.data[0]
+            data=response.data
         )
         
     except Exception as e:
@@ -338,21 +321,18 @@ async def add_to_wishlist(
 async def remove_from_wishlist(
     product_id: str,
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Remove product from wishlist"""
     try:
-        # Check if item exists in wishlist
-        existing_item = supabase.table("wishlist").select("id").eq("user_id", current_user["id"]).eq("product_id", product_id).execute()
+        response = await supabase.table("wishlist").delete().eq("user_id", current_user["id"]).eq("product_id", product_id).execute()
         
-        if not existing_item.data:
+        if not response.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product not found in wishlist"
             )
         
-        response = supabase.table("wishlist").delete().eq("user_id", current_user["id"]).eq("product_id", product_id).execute()
-        
         return SuccessResponse(
             message="Product removed from wishlist",
             data={"product_id": product_id}
@@ -371,7 +351,7 @@ async def remove_from_wishlist(
 async def upload_avatar(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Upload user avatar image"""
     try:
@@ -379,9 +359,8 @@ async def upload_avatar(
         avatar_url = await storage_manager.upload_avatar(current_user["id"], file)
         
         # Update user avatar URL in database
-        response = supabase.table("users").update({
-            "avatar": avatar_url,
-            "updated_at": "now()"
+        response = await supabase.table("users").update({
+            "avatar": avatar_url
         }).eq("id", current_user["id"]).execute()
         
         if not response.data:
@@ -408,19 +387,29 @@ async def upload_avatar(
 
 @router.post("/avatar/upload-base64", response_model=SuccessResponse)
 async def upload_avatar_base64(
-    base64_data: str = Form(...),
+    base64_data: Optional[str] = Form(None),
+    base64_file: Optional[UploadFile] = File(None),
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
-    """Upload user avatar from base64 encoded data"""
+    """Upload user avatar from base64 encoded data (a form field, or a text file part for large images)"""
     try:
+        if base64_file is not None:
+            # A file part is spooled by the multipart parser, so read it as bytes (no str copy)
+            base64_data = await base64_file.read()
+        
+        if not base64_data:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Base64 image data is required"
+            )
+        
         # Upload image to storage from base64
         avatar_url = await storage_manager.upload_from_base64(current_user["id"], base64_data)
         
         # Update user avatar URL in database
-        response = supabase.table("users").update({
-            "avatar": avatar_url,
-            "updated_at": "now()"
+        response = await supabase.table("users").update({
+            "avatar": avatar_url
         }).eq("id", current_user["id"]).execute()
         
         if not response.data:
@@ -448,7 +437,7 @@ async def upload_avatar_base64(
 @router.delete("/avatar", response_model=SuccessResponse)
 async def delete_avatar(
     current_user: dict = Depends(get_current_user),
-    supabase: Client = Depends(get_current_supabase)
+    supabase: AsyncClient = Depends(get_current_async_supabase)
 ):
     """Delete user avatar"""
     try:
@@ -456,9 +445,8 @@ async def delete_avatar(
         await storage_manager.delete_user_avatar(current_user["id"])
         
         # Remove avatar URL from user record
-        response = supabase.table("users").update({
-            "avatar": None,
-            "updated_at": "now()"
+        response = await supabase.table("users").update({
+            "avatar": None
         }).eq("id", current_user["id"]).execute()
         
         if not response.data:
@@ -0,0 +1,38 @@
+"""
+In-process caching utilities for hot read endpoints
+
+Caches are plain module-level TTLCache instances, so on Vercel/Mangum they only
+persist while a warm container is reused between invocations.
+"""
+import asyncio
+import weakref
+from typing import Any, Awaitable, Callable, Hashable
+
+from cachetools import TTLCache
+
+# One lock per (cache, key) so concurrent misses trigger a single load
+_locks: "weakref.WeakValueDictionary[tuple, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+async def get_or_set(cache: TTLCache, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+    """Return the cached value for key, awaiting loader() and storing its result on a miss"""
+    try:
+        return cache[key]
+    except KeyError:
+        pass
+
+    lock_key = (id(cache), key)
+    lock = _locks.get(lock_key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _locks[lock_key] = lock
+
+    async with lock:
+        # Another request may have filled the cache while we waited
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        value = await loader()
+        cache[key] = value
+        return value
@@ -0,0 +1,24 @@
+"""
+Response helpers for endpoints that build their JSON payload by hand
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+def _default(obj: Any) -> Any:
+    # Decimals are rendered as strings, matching Pydantic's JSON output
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError
+
+def json_dumps(content: Any) -> bytes:
+    """Encode a payload to JSON bytes (Decimal-aware), e.g. for caching encoded bodies"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also serializes Decimal; returning it skips jsonable_encoder and response_model validation"""
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
@@ -2,21 +2,46 @@
 Storage utilities for Supabase Storage operations
 """
 import os
-import uuid
+import asyncio
+import hashlib
 import base64
 from io import BytesIO
 from PIL import Image
-from typing import Optional, Tuple
-from supabase import create_client, Client
+from typing import BinaryIO, Optional, Tuple, Union
+from supabase import Client
 from fastapi import HTTPException, UploadFile
-import mimetypes
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from app.database import get_supabase_admin_client
+from app.utils.storage_async import get_public_url, upload_bytes
+
+logger = logging.getLogger(__name__)
+
+# Dedicated pool for image decode/resize so bursts of uploads cannot starve the
+# default executor (bcrypt, sync I/O). PIL releases the GIL while it decodes.
+_image_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="image")
+
+async def run_image_task(func, *args):
+    """Run a CPU-bound image function on the image thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(_image_executor, func, *args)
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """Return the image MIME type identified by a file's first 12 bytes, or None"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return None
 
 def upload_image_to_bucket(supabase_client: Client, bucket_name: str, file_data: bytes, remote_file_path: str, content_type: str = "image/jpeg") -> str:
     """Upload image data to Supabase storage bucket - based on test_storage.py function"""
     try:
-        print(f"📤 Uploading image to {bucket_name}/{remote_file_path}")
-        print(f"📊 File size: {len(file_data)} bytes")
-        print(f"🔑 Using service role key to bypass RLS policies")
+        logger.debug("Uploading %d bytes to %s/%s", len(file_data), bucket_name, remote_file_path)
         
         # Upload to Supabase storage using service client (bypasses RLS)
         upload_response = supabase_client.storage.from_(bucket_name).upload(
@@ -30,60 +55,59 @@ def upload_image_to_bucket(supabase_client: Client, bucket_name: str, file_data:
         
         # Check if upload was successful
         if hasattr(upload_response, 'error') and upload_response.error:
-            print(f"❌ Upload failed: {upload_response.error}")
             raise Exception(f"Upload failed: {upload_response.error}")
         
         # Get the public URL of uploaded file
-        public_url = supabase_client.storage.from_(bucket_name).get_public_url(remote_file_path)
-        print(f"✅ Image uploaded successfully!")
-        print(f"🔗 Public URL: {public_url}")
+        public_url = get_public_url(bucket_name, remote_file_path)
+        logger.debug("Uploaded image available at %s", public_url)
         return public_url
         
     except Exception as e:
-        print(f"❌ Upload error: {e}")
+        logger.warning("Upload to %s/%s failed: %s", bucket_name, remote_file_path, e)
         raise Exception(f"Upload error: {str(e)}")
 
 class StorageManager:
     def __init__(self):
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-        self.supabase_anon_key = os.getenv("SUPABASE_ANON_KEY")
         
         if not all([self.supabase_url, self.supabase_service_key]):
             raise ValueError("Missing Supabase credentials in environment variables")
         
-        # Service client for uploads (bypasses RLS)
-        self.service_client: Client = create_client(self.supabase_url, self.supabase_service_key)
-        # Public client for getting URLs
-        self.public_client: Client = create_client(self.supabase_url, self.supabase_anon_key)
-        
         self.bucket_name = "Ecommerce-Storage"
         self.avatar_folder = "avatars"
         self.max_file_size = 5 * 1024 * 1024  # 5MB
-        self.allowed_types = ["image/jpeg", "image/png", "image/webp", "image/gif"]
+        self.allowed_types = frozenset(("image/jpeg", "image/png", "image/webp", "image/gif"))
 
-    def _validate_image(self, file_data: bytes, content_type: str) -> bool:
-        """Validate image file"""
-        if len(file_data) > self.max_file_size:
-            raise HTTPException(status_code=413, detail="File too large. Maximum size is 5MB")
-        
-        if content_type not in self.allowed_types:
+    @property
+    def service_client(self) -> Client:
+        """Shared service client for uploads (bypasses RLS); public URLs need no client"""
+        # Looked up on each use so it follows the client rebuilt after close_supabase_clients()
+        return get_supabase_admin_client()
+
+    def _validate_image(self, file_size: int, header: bytes) -> bool:
+        """Validate image type (from its leading bytes) and size; the content itself is checked when it is decoded"""
+        if sniff_image_type(header) not in self.allowed_types:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Invalid file type. Allowed types: {', '.join(self.allowed_types)}"
+                detail=f"Invalid file type. Allowed types: {', '.join(sorted(self.allowed_types))}"
             )
         
+        if file_size > self.max_file_size:
+            raise HTTPException(status_code=413, detail="File too large. Maximum size is 5MB")
+        
+        return True
+
+    def _resize_image(self, source: Union[bytes, BinaryIO], max_size: Tuple[int, int] = (800, 800)) -> bytes:
+        """Resize image to optimize storage; source is raw bytes or a readable file object"""
         try:
-            # Verify it's a valid image
-            Image.open(BytesIO(file_data))
-            return True
+            image = Image.open(BytesIO(source) if isinstance(source, bytes) else source)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid image file")
-
-    def _resize_image(self, file_data: bytes, max_size: Tuple[int, int] = (800, 800)) -> bytes:
-        """Resize image to optimize storage"""
+        
         try:
-            image = Image.open(BytesIO(file_data))
+            # Let libjpeg decode at a reduced scale when the image is much larger than needed
+            image.draft("RGB", max_size)
             
             # Convert RGBA to RGB if necessary
             if image.mode in ("RGBA", "P"):
@@ -92,95 +116,67 @@ class StorageManager:
             # Resize maintaining aspect ratio
             image.thumbnail(max_size, Image.Resampling.LANCZOS)
             
-            # Save optimized image
+            # Save optimized image (4:2:0 chroma subsampling, single-scan baseline JPEG)
             output = BytesIO()
-            image.save(output, format="JPEG", quality=85, optimize=True)
+            image.save(output, format="JPEG", quality=85, optimize=True, subsampling=2, progressive=False)
             return output.getvalue()
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
 
+    def _avatar_path(self, user_id: str) -> str:
+        """Storage path of a user's avatar"""
+        return f"{self.avatar_folder}/{user_id}.jpg"
+
     async def upload_avatar(self, user_id: str, file: UploadFile) -> str:
         """Upload user avatar to Supabase Storage"""
         try:
-            # Read file data
-            file_data = await file.read()
-            content_type = file.content_type or mimetypes.guess_type(file.filename)[0]
-            
-            # Validate image
-            self._validate_image(file_data, content_type)
-            
-            # Resize image for optimization
-            optimized_data = self._resize_image(file_data)
+            # Validate without reading the upload into memory
+            header = file.file.read(12)
+            file_size = file.size
+            if file_size is None:
+                file_size = file.file.seek(0, os.SEEK_END)
+            file.file.seek(0)
+            self._validate_image(file_size, header)
             
-            # Generate unique filename
-            file_extension = "jpg"  # Always save as JPEG for consistency
-            filename = f"{user_id}_{uuid.uuid4().hex}.{file_extension}"
-            file_path = f"{self.avatar_folder}/{filename}"
+            # Decode straight from the spooled upload and resize for optimization
+            optimized_data = await run_image_task(self._resize_image, file.file)
             
-            # Delete old avatar if exists
-            await self.delete_user_avatar(user_id)
-            
-            # Upload to Supabase Storage
-            upload_response = self.service_client.storage.from_(self.bucket_name).upload(
-                file_path,
-                optimized_data,
-                file_options={
-                    "content-type": "image/jpeg",
-                    "upsert": True  # Changed from "true" string to boolean True
-                }
-            )
-            
-            if hasattr(upload_response, 'error') and upload_response.error:
-                raise HTTPException(status_code=500, detail=f"Upload failed: {upload_response.error}")
-            
-            # Get public URL
-            public_url = self.public_client.storage.from_(self.bucket_name).get_public_url(file_path)
-            
-            return public_url
+            return await self._store_avatar(user_id, optimized_data)
             
         except HTTPException:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Upload error: {str(e)}")
 
-    async def upload_from_base64(self, user_id: str, base64_data: str) -> str:
+    def _decode_base64_image(self, base64_data: Union[str, bytes]) -> bytes:
+        """Decode, validate and resize a base64 image (optionally a data URL)"""
+        # Work on bytes and slice off any data URL prefix without copying the payload
+        raw = base64_data.encode("ascii") if isinstance(base64_data, str) else base64_data
+        comma = raw.find(b",", 0, 100) if raw.startswith(b"data:") else -1
+        payload = memoryview(raw)[comma + 1:]
+        
+        # Every 4 base64 characters carry 3 bytes, so oversized images are rejected before decoding
+        if len(payload) // 4 * 3 > self.max_file_size + 2:
+            raise HTTPException(status_code=413, detail="File too large. Maximum size is 5MB")
+        
+        file_data = base64.b64decode(payload)
+        self._validate_image(len(file_data), file_data[:12])
+        return self._resize_image(file_data)
+
+    async def _store_avatar(self, user_id: str, optimized_data: bytes) -> str:
+        """Upload a processed avatar (one object per user, overwritten in place) and return its versioned URL"""
+        public_url = await upload_bytes(self.bucket_name, self._avatar_path(user_id), optimized_data)
+        
+        # The version parameter busts CDN caches of the previous avatar
+        return f"{public_url}?v={hashlib.md5(optimized_data).hexdigest()[:12]}"
+
+    async def upload_from_base64(self, user_id: str, base64_data: Union[str, bytes]) -> str:
         """Upload avatar from base64 encoded data"""
         try:
-            # Remove data URL prefix if present
-            if base64_data.startswith('data:'):
-                base64_data = base64_data.split(',')[1]
-            
-            # Decode base64
-            file_data = base64.b64decode(base64_data)
+            # Decoding and resizing both run on the image pool, off the event loop
+            optimized_data = await run_image_task(self._decode_base64_image, base64_data)
             
-            # Validate and process image
-            self._validate_image(file_data, "image/jpeg")
-            optimized_data = self._resize_image(file_data)
-            
-            # Generate filename and upload
-            filename = f"{user_id}_{uuid.uuid4().hex}.jpg"
-            file_path = f"{self.avatar_folder}/{filename}"
-            
-            # Delete old avatar if exists
-            await self.delete_user_avatar(user_id)
-            
-            # Upload to storage
-            upload_response = self.service_client.storage.from_(self.bucket_name).upload(
-                file_path,
-                optimized_data,
-                file_options={
-                    "content-type": "image/jpeg",
-                    "upsert": True  # Changed from "true" string to boolean True
-                }
-            )
-            
-            if hasattr(upload_response, 'error') and upload_response.error:
-                raise HTTPException(status_code=500, detail=f"Upload failed: {upload_response.error}")
-            
-            # Get public URL
-            public_url = self.public_client.storage.from_(self.bucket_name).get_public_url(file_path)
-            
-            return public_url
+            return await self._store_avatar(user_id, optimized_data)
             
         except HTTPException:
             raise
@@ -190,29 +186,30 @@ class StorageManager:
     async def delete_user_avatar(self, user_id: str) -> bool:
         """Delete user's existing avatar from storage"""
         try:
-            # List files in avatar folder
-            files = self.service_client.storage.from_(self.bucket_name).list(self.avatar_folder)
-            
-            # Find and delete user's existing avatars
-            user_files = [f for f in files if f['name'].startswith(f"{user_id}_")]
+            # List only this user's files (the current avatar plus any legacy
+            # "{user_id}_<random>.jpg" uploads) with a server-side prefix search
+            files = self.service_client.storage.from_(self.bucket_name).list(
+                self.avatar_folder, {"search": user_id}
+            )
+            user_files = [f for f in files if f['name'].startswith(user_id)]
             
             if user_files:
                 file_paths = [f"{self.avatar_folder}/{f['name']}" for f in user_files]
                 delete_response = self.service_client.storage.from_(self.bucket_name).remove(file_paths)
                 
                 if hasattr(delete_response, 'error') and delete_response.error:
-                    print(f"Warning: Failed to delete old avatar: {delete_response.error}")
+                    logger.warning("Failed to delete old avatar: %s", delete_response.error)
                     return False
             
             return True
             
         except Exception as e:
-            print(f"Warning: Error deleting old avatar: {str(e)}")
+            logger.warning("Error deleting old avatar: %s", e)
             return False
 
     def get_avatar_url(self, file_path: str) -> str:
         """Get public URL for avatar"""
-        return self.public_client.storage.from_(self.bucket_name).get_public_url(file_path)
+        return get_public_url(self.bucket_name, file_path)
 
 # Global storage manager instance
 storage_manager = StorageManager()
\ No newline at end of file
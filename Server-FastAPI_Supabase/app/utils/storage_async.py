@@ -0,0 +1,56 @@
+"""
+Async Supabase Storage helpers using the Storage REST API directly
+"""
+import os
+import httpx
+from typing import Optional
+from urllib.parse import quote
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+# Shared client so uploads reuse keep-alive connections to Supabase Storage;
+# created on first use and again after close_client()
+_client: Optional[httpx.AsyncClient] = None
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared Storage client, creating it if needed"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(http2=True, timeout=20)
+    return _client
+
+# Public object URLs follow a fixed template, so they are formatted locally
+_PUBLIC_URL_BASE = f"{SUPABASE_URL}/storage/v1/object/public"
+
+def get_public_url(bucket_name: str, file_path: str) -> str:
+    """Build the public URL of an object in a public bucket (no network call)"""
+    return f"{_PUBLIC_URL_BASE}/{quote(bucket_name)}/{quote(file_path)}"
+
+async def upload_bytes(bucket_name: str, file_path: str, file_data: bytes, content_type: str = "image/jpeg") -> str:
+    """Upload bytes to a storage bucket (overwriting any existing object) and return its public URL"""
+    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+        raise ValueError("Missing Supabase credentials in environment variables")
+
+    response = await _get_client().post(
+        f"{SUPABASE_URL}/storage/v1/object/{bucket_name}/{file_path}",
+        headers={
+            "apikey": SUPABASE_SERVICE_ROLE_KEY,
+            "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+            "Content-Type": content_type,
+            "x-upsert": "true"
+        },
+        content=file_data
+    )
+
+    if response.is_error:
+        raise Exception(f"Upload failed: {response.status_code} {response.text}")
+
+    return get_public_url(bucket_name, file_path)
+
+async def close_client() -> None:
+    """Close the shared Storage connection pool (shutdown hook)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,410 @@
+-- Incremental migrations for the ShopZone API.
+-- Apply after database_schema.sql; every statement is safe to re-run.
+
+-- Category counts aggregated in Postgres (GET /api/v1/products/categories)
+-- The partial index lets the GROUP BY run as an index-only scan.
+CREATE INDEX IF NOT EXISTS idx_products_active_category
+    ON products(category) WHERE is_active;
+
+CREATE OR REPLACE FUNCTION product_category_counts()
+RETURNS TABLE(name TEXT, count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT category, COUNT(*)
+    FROM products
+    WHERE is_active AND category IS NOT NULL
+    GROUP BY category
+    ORDER BY category;
+$$;
+
+-- Keyset pagination for product reviews (created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_reviews_product_created
+    ON reviews(product_id, created_at DESC, id DESC);
+
+-- Full-text product search (GET /api/v1/products?search=...)
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vec TSVECTOR
+    GENERATED ALWAYS AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(description, ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vec ON products USING GIN(search_vec);
+
+-- Filters, ordering and pagination are applied by PostgREST on top of the
+-- result; the function is inlined by the planner so they still use indexes.
+-- Rows carry the ProductResponse columns only (product_listing), so search_vec
+-- and rating_sum are not sent to the API.
+CREATE OR REPLACE VIEW product_listing WITH (security_invoker = true) AS
+    SELECT id, name, description, price, category, stock_quantity, image_url,
+           is_active, is_featured, rating, review_count, created_at, updated_at
+    FROM products;
+
+DROP FUNCTION IF EXISTS search_products(TEXT);
+
+CREATE FUNCTION search_products(q TEXT)
+RETURNS SETOF product_listing
+LANGUAGE sql STABLE AS $$
+    SELECT id, name, description, price, category, stock_quantity, image_url,
+           is_active, is_featured, rating, review_count, created_at, updated_at
+    FROM products
+    WHERE search_vec @@ websearch_to_tsquery('english', q);
+$$;
+
+-- Product rating aggregate. rating_sum and review_count are maintained
+-- incrementally by add_review(); recompute_product_rating() rebuilds them from
+-- the reviews table (full scan of one product's reviews) for repairs.
+ALTER TABLE products ADD COLUMN IF NOT EXISTS rating_sum BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION recompute_product_rating(p_id UUID)
+RETURNS VOID
+LANGUAGE sql AS $$
+    UPDATE products p
+    SET rating = COALESCE(r.avg_rating, 0),
+        rating_sum = r.rating_sum,
+        review_count = r.review_count
+    FROM (
+        SELECT ROUND(AVG(rating)::numeric, 1) AS avg_rating,
+               COALESCE(SUM(rating), 0) AS rating_sum,
+               COUNT(*) AS review_count
+        FROM reviews
+        WHERE product_id = p_id
+    ) r
+    WHERE p.id = p_id;
+$$;
+
+-- Backfill rating_sum/review_count for existing products
+SELECT recompute_product_rating(id) FROM products;
+
+-- Existence probes in POST /api/v1/products/{id}/reviews
+CREATE INDEX IF NOT EXISTS idx_reviews_product_user ON reviews(product_id, user_id);
+CREATE INDEX IF NOT EXISTS idx_products_id_active ON products(id, is_active);
+
+-- One review per user and product; lets the API drop its duplicate pre-check.
+-- The constraint's unique index supersedes idx_reviews_product_user.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_reviews_user_product') THEN
+        ALTER TABLE reviews ADD CONSTRAINT uq_reviews_user_product UNIQUE (product_id, user_id);
+    END IF;
+END $$;
+
+DROP INDEX IF EXISTS idx_reviews_product_user;
+
+-- Let Postgres generate row ids so the functions below can omit them.
+-- database_schema.sql already sets these; reviews is created outside it.
+ALTER TABLE reviews ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE cart_items ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE orders ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE order_items ALTER COLUMN id SET DEFAULT gen_random_uuid();
+
+-- Add a review to an active product and refresh its rating in one round trip
+-- and one transaction. Returns no rows when the product does not exist or is
+-- inactive. Locking the product row serializes concurrent reviews of the same
+-- product, so the O(1) running-sum update below never loses an increment.
+CREATE OR REPLACE FUNCTION add_review(p_id UUID, u_id UUID, p_rating INT, p_comment TEXT)
+RETURNS SETOF reviews
+LANGUAGE plpgsql AS $$
+DECLARE
+    new_review reviews;
+BEGIN
+    PERFORM 1 FROM products WHERE id = p_id AND is_active FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO reviews (product_id, user_id, rating, comment, created_at)
+    VALUES (p_id, u_id, p_rating, p_comment, NOW())
+    RETURNING * INTO new_review;
+
+    UPDATE products
+    SET rating_sum = rating_sum + p_rating,
+        review_count = COALESCE(review_count, 0) + 1,
+        rating = ROUND((rating_sum + p_rating)::numeric / (COALESCE(review_count, 0) + 1), 1)
+    WHERE id = p_id;
+
+    RETURN NEXT new_review;
+END $$;
+
+-- Place an order in one round trip and one transaction (POST /api/v1/orders):
+-- lock and validate the products, insert the order and its items at current
+-- prices, decrement stock and clear the user's cart. Row ids come from the
+-- tables' gen_random_uuid() defaults.
+-- p_items: [{"product_id": "<uuid>", "quantity": <int>}, ...]
+-- Errors use PostgREST's PTxxx codes so the HTTP status is 404 (unknown or
+-- inactive product) or 400 (insufficient stock).
+DROP FUNCTION IF EXISTS decrement_stock(JSONB);
+
+CREATE OR REPLACE FUNCTION create_order(p_user UUID, p_items JSONB, p_shipping JSONB, p_payment TEXT, p_notes TEXT)
+RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_order_id UUID;
+    v_total NUMERIC;
+    v_missing TEXT;
+    v_short TEXT;
+BEGIN
+    -- Lock in id order so concurrent orders for the same products cannot deadlock
+    PERFORM 1 FROM products
+    WHERE id IN (SELECT product_id FROM jsonb_to_recordset(p_items) AS i(product_id UUID, quantity INT))
+    ORDER BY id
+    FOR UPDATE;
+
+    SELECT i.product_id::TEXT INTO v_missing
+    FROM jsonb_to_recordset(p_items) AS i(product_id UUID, quantity INT)
+    LEFT JOIN products p ON p.id = i.product_id AND p.is_active
+    WHERE p.id IS NULL
+    LIMIT 1;
+
+    IF v_missing IS NOT NULL THEN
+        RAISE EXCEPTION 'Product % not found', v_missing USING ERRCODE = 'PT404';
+    END IF;
+
+    -- Stock is checked against the total quantity per product
+    SELECT p.name INTO v_short
+    FROM (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM jsonb_to_recordset(p_items) AS i(product_id UUID, quantity INT)
+        GROUP BY product_id
+    ) r
+    JOIN products p ON p.id = r.product_id
+    WHERE p.stock_quantity < r.quantity
+    LIMIT 1;
+
+    IF v_short IS NOT NULL THEN
+        RAISE EXCEPTION 'Insufficient stock for product %', v_short USING ERRCODE = 'PT400';
+    END IF;
+
+    SELECT SUM(p.price * i.quantity) INTO v_total
+    FROM jsonb_to_recordset(p_items) AS i(product_id UUID, quantity INT)
+    JOIN products p ON p.id = i.product_id;
+
+    INSERT INTO orders (user_id, status, total_amount, shipping_address, payment_method, notes, created_at)
+    VALUES (p_user, 'pending', v_total, p_shipping, p_payment, p_notes, NOW())
+    RETURNING id INTO v_order_id;
+
+    INSERT INTO order_items (order_id, product_id, quantity, unit_price)
+    SELECT v_order_id, i.product_id, i.quantity, p.price
+    FROM jsonb_to_recordset(p_items) AS i(product_id UUID, quantity INT)
+    JOIN products p ON p.id = i.product_id;
+
+    UPDATE products p
+    SET stock_quantity = p.stock_quantity - r.quantity
+    FROM (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM jsonb_to_recordset(p_items) AS i(product_id UUID, quantity INT)
+        GROUP BY product_id
+    ) r
+    WHERE p.id = r.product_id;
+
+    DELETE FROM cart_items WHERE user_id = p_user;
+
+    RETURN jsonb_build_object('order_id', v_order_id, 'total_amount', v_total, 'status', 'pending');
+END $$;
+
+-- Add a product to a user's cart in one round trip (POST /api/v1/cart/add):
+-- validate the product and stock, then insert the row or add to its quantity
+-- via cart_items' UNIQUE(user_id, product_id). Same PTxxx error codes as
+-- create_order(). Stock is re-validated under lock when the order is placed.
+CREATE OR REPLACE FUNCTION add_to_cart(p_user UUID, p_product UUID, p_qty INT)
+RETURNS cart_items
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_stock INT;
+    v_current INT;
+    v_item cart_items;
+BEGIN
+    SELECT stock_quantity INTO v_stock FROM products WHERE id = p_product AND is_active;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Product not found' USING ERRCODE = 'PT404';
+    END IF;
+
+    SELECT quantity INTO v_current FROM cart_items WHERE user_id = p_user AND product_id = p_product;
+    IF v_stock < COALESCE(v_current, 0) + p_qty THEN
+        IF v_current IS NULL THEN
+            RAISE EXCEPTION 'Insufficient stock' USING ERRCODE = 'PT400';
+        END IF;
+        RAISE EXCEPTION 'Insufficient stock for requested quantity' USING ERRCODE = 'PT400';
+    END IF;
+
+    INSERT INTO cart_items (user_id, product_id, quantity, created_at)
+    VALUES (p_user, p_product, p_qty, NOW())
+    ON CONFLICT (user_id, product_id)
+    DO UPDATE SET quantity = cart_items.quantity + EXCLUDED.quantity, updated_at = NOW()
+    RETURNING * INTO v_item;
+
+    RETURN v_item;
+END $$;
+
+-- Cart and order lookup paths.
+-- add_to_cart()'s ON CONFLICT needs UNIQUE(user_id, product_id), which
+-- database_schema.sql declares; make sure it exists on older databases.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'cart_items_user_id_product_id_key') THEN
+        ALTER TABLE cart_items ADD CONSTRAINT cart_items_user_id_product_id_key UNIQUE (user_id, product_id);
+    END IF;
+END $$;
+
+-- The unique index leads with user_id, so it also serves per-user cart reads
+DROP INDEX IF EXISTS idx_cart_items_user_id;
+
+-- GET /api/v1/orders: eq(user_id) ordered by created_at DESC, read in index order
+CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders(user_id, created_at DESC);
+DROP INDEX IF EXISTS idx_orders_user_id;
+
+-- Embedded order_items and cancel_order() stock restore
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
+
+-- Cancel a pending or confirmed order and put its items back in stock in one
+-- round trip and one transaction (PUT /api/v1/orders/{id}/cancel). The order
+-- row is locked so two concurrent cancels cannot restore stock twice.
+-- Same PTxxx error codes as create_order().
+CREATE OR REPLACE FUNCTION cancel_order(p_order UUID, p_user UUID)
+RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_status TEXT;
+BEGIN
+    SELECT status INTO v_status FROM orders WHERE id = p_order AND user_id = p_user FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Order not found' USING ERRCODE = 'PT404';
+    END IF;
+
+    IF v_status NOT IN ('pending', 'confirmed') THEN
+        RAISE EXCEPTION 'Order cannot be cancelled' USING ERRCODE = 'PT400';
+    END IF;
+
+    UPDATE orders SET status = 'cancelled', updated_at = NOW() WHERE id = p_order;
+
+    UPDATE products p
+    SET stock_quantity = p.stock_quantity + r.quantity
+    FROM (
+        SELECT product_id, SUM(quantity) AS quantity
+        FROM order_items
+        WHERE order_id = p_order
+        GROUP BY product_id
+    ) r
+    WHERE p.id = r.product_id;
+
+    RETURN jsonb_build_object('order_id', p_order, 'status', 'cancelled');
+END $$;
+
+-- Confirm a payment in one round trip and one transaction (POST
+-- /api/v1/payments/confirm): lock the intent, record the payment, mark the
+-- intent succeeded and, when given, the order confirmed and paid.
+-- Raises PT404 for an unknown intent.
+CREATE OR REPLACE FUNCTION confirm_payment_tx(p_intent TEXT, p_method TEXT, p_order UUID, p_user UUID)
+RETURNS payments
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_intent payment_intents;
+    v_payment payments;
+BEGIN
+    SELECT * INTO v_intent FROM payment_intents WHERE id = p_intent FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Payment intent not found' USING ERRCODE = 'PT404';
+    END IF;
+
+    INSERT INTO payments (id, user_id, order_id, payment_intent_id, payment_method_id, amount, currency, status, created_at)
+    VALUES (gen_random_uuid(), p_user, p_order, p_intent, p_method, v_intent.amount, v_intent.currency, 'succeeded', NOW())
+    RETURNING * INTO v_payment;
+
+    IF p_order IS NOT NULL THEN
+        UPDATE orders SET status = 'confirmed', payment_status = 'paid', updated_at = NOW() WHERE id = p_order;
+    END IF;
+
+    UPDATE payment_intents SET status = 'succeeded' WHERE id = p_intent;
+
+    RETURN v_payment;
+END $$;
+
+-- Add an address (POST /api/v1/users/addresses), clearing the user's other
+-- defaults first when it is the new default. The per-user advisory lock keeps
+-- two concurrent default addresses from both staying marked as default.
+CREATE OR REPLACE FUNCTION add_address(p_user UUID, p_address JSONB)
+RETURNS addresses
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_address addresses;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('addresses:' || p_user::TEXT));
+
+    IF COALESCE((p_address->>'is_default')::BOOLEAN, FALSE) THEN
+        UPDATE addresses SET is_default = FALSE WHERE user_id = p_user AND is_default;
+    END IF;
+
+    INSERT INTO addresses (id, user_id, type, full_name, phone, address_line_1, address_line_2,
+                           city, state, postal_code, country, is_default, created_at)
+    SELECT gen_random_uuid(), p_user, a.type, a.full_name, a.phone, a.address_line_1, a.address_line_2,
+           a.city, a.state, a.postal_code, a.country, COALESCE(a.is_default, FALSE), NOW()
+    FROM jsonb_populate_record(NULL::addresses, p_address) a
+    RETURNING * INTO v_address;
+
+    RETURN v_address;
+END $$;
+
+-- End sessions left idle inside an open transaction so they cannot hold locks
+-- (e.g. the product row locks taken by create_order()) indefinitely. Plain idle
+-- sessions are left alone: those are PostgREST's own pooled connections.
+DO $$
+BEGIN
+    EXECUTE format('ALTER DATABASE %I SET idle_in_transaction_session_timeout = %L', current_database(), '60s');
+END $$;
+
+-- Timestamps and row ids are filled in by Postgres, so API payloads omit them.
+-- database_schema.sql covers users, products, cart_items and orders; the
+-- tables created outside it get the same defaults and updated_at trigger here.
+ALTER TABLE users ALTER COLUMN updated_at SET DEFAULT NOW();
+ALTER TABLE addresses ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE addresses ALTER COLUMN created_at SET DEFAULT NOW();
+ALTER TABLE addresses ALTER COLUMN updated_at SET DEFAULT NOW();
+ALTER TABLE wishlist ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE wishlist ALTER COLUMN created_at SET DEFAULT NOW();
+ALTER TABLE payment_intents ALTER COLUMN created_at SET DEFAULT NOW();
+
+DROP TRIGGER IF EXISTS update_users_updated_at ON users;
+CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_addresses_updated_at ON addresses;
+CREATE TRIGGER update_addresses_updated_at BEFORE UPDATE ON addresses
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Add a product to a user's wishlist in one round trip (POST
+-- /api/v1/users/wishlist/add). Errors use PostgREST's PTxxx codes: 404 for an
+-- unknown or inactive product, 400 when it is already in the wishlist.
+-- UNIQUE(user_id, product_id) makes concurrent adds of the same product insert
+-- one row; existing duplicates (keeping the oldest) are removed first.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_wishlist_user_product') THEN
+        DELETE FROM wishlist w
+        USING wishlist older
+        WHERE w.user_id = older.user_id AND w.product_id = older.product_id
+          AND (w.created_at, w.id) > (older.created_at, older.id);
+        ALTER TABLE wishlist ADD CONSTRAINT uq_wishlist_user_product UNIQUE (user_id, product_id);
+    END IF;
+END $$;
+
+-- The constraint's unique index supersedes the plain one
+DROP INDEX IF EXISTS idx_wishlist_user_product;
+
+CREATE OR REPLACE FUNCTION wishlist_add_if_absent(p_user UUID, p_product UUID)
+RETURNS wishlist
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_item wishlist;
+BEGIN
+    PERFORM 1 FROM products WHERE id = p_product AND is_active;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Product not found' USING ERRCODE = 'PT404';
+    END IF;
+
+    INSERT INTO wishlist (user_id, product_id)
+    VALUES (p_user, p_product)
+    ON CONFLICT (user_id, product_id) DO NOTHING
+    RETURNING * INTO v_item;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Product already in wishlist' USING ERRCODE = 'PT400';
+    END IF;
+
+    RETURN v_item;
+END $$;
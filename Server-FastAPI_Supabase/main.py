@@ -1,12 +1,18 @@
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
+from contextlib import asynccontextmanager
+import asyncio
+import orjson
 import os
 import sys
+import time
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Load environment variables (Vercel injects them; .env files are for local runs)
+if not os.getenv("VERCEL"):
+    load_dotenv()
 
 # Environment variable validation
 REQUIRED_ENV_VARS = [
@@ -17,12 +23,21 @@ REQUIRED_ENV_VARS = [
 missing_vars = [var for var in REQUIRED_ENV_VARS if not os.getenv(var)]
 ENV_VARS_VALID = len(missing_vars) == 0
 
+# Read once at startup; the environment does not change while the process runs
+APP_NAME = os.getenv("APP_NAME", "ShopZone Ecommerce API")
+APP_VERSION = os.getenv("APP_VERSION", "1.0.0")
+ENV_VARS_PRESENT = {
+    "supabase_url": bool(os.getenv("SUPABASE_URL")),
+    "supabase_key": bool(os.getenv("SUPABASE_ANON_KEY")),
+    "jwt_secret": bool(os.getenv("JWT_SECRET_KEY"))
+}
+
 # Add error handling for imports
 IMPORTS_SUCCESS = True
 IMPORT_ERROR = None
 try:
     from app.routers import auth, products, orders, users, cart, payments
-    from app.database import get_supabase_client
+    from app.database import get_supabase_client, ping_supabase, start_keepalive, close_supabase_clients
     from app.models.response import ErrorResponse
 except ImportError as e:
     print(f"Import error: {e}")
@@ -33,35 +48,57 @@ except Exception as e:
     IMPORTS_SUCCESS = False
     IMPORT_ERROR = str(e)
 
-# Create FastAPI app without lifespan for serverless compatibility
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep pooled connections alive between requests. This only runs under uvicorn:
+    # on Vercel, Mangum would start and cancel it around every invocation, so
+    # api/index.py turns the lifespan off
+    if IMPORTS_SUCCESS and ENV_VARS_VALID:
+        start_keepalive()
+    yield
+    # Process exit under uvicorn (api/index.py runs Mangum with lifespan="off")
+    if IMPORTS_SUCCESS and ENV_VARS_VALID:
+        await close_supabase_clients()
+
 app = FastAPI(
-    title=os.getenv("APP_NAME", "ShopZone Ecommerce API"),
-    version=os.getenv("APP_VERSION", "1.0.0"),
-    description="A complete FastAPI backend for ecommerce website with Supabase integration"
+    title=APP_NAME,
+    version=APP_VERSION,
+    description="A complete FastAPI backend for ecommerce website with Supabase integration",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# CORS middleware with proper wildcard support
+# CORS: browsers reject "*" together with credentials, and CORSMiddleware matches
+# allow_origins literally, so this project's Vercel preview deployments go through
+# allow_origin_regex (anchored to the project prefix, not any *.vercel.app site)
+CORS_ORIGINS = [
+    "http://localhost:5173",
+    "http://localhost:3000",
+    "http://127.0.0.1:5173",
+    "https://shop-zone-e-commerce-platform-lm5r.vercel.app",
+]
+if os.getenv("FRONTEND_URL"):
+    CORS_ORIGINS.append(os.getenv("FRONTEND_URL").rstrip("/"))
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:5173", 
-        "http://localhost:3000", 
-        "http://127.0.0.1:5173",
-        "https://shop-zone-e-commerce-platform-lm5r.vercel.app",
-        "https://*.vercel.app",
-        "*"  # Allow all origins for now to test
-    ],
+    allow_origins=CORS_ORIGINS,
+    allow_origin_regex=r"https://shop-zone-e-commerce-platform(-[a-z0-9-]+)?\.vercel\.app",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browsers reuse a preflight result instead of repeating OPTIONS before each request
+    max_age=86400,
 )
 
-# Basic endpoints that work without database
-@app.get("/")
-async def root():
-    return {
+# Basic endpoints that work without database. Their payloads only depend on
+# state fixed at startup, so they are encoded once and served as bytes.
+def _json_bytes_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+_ROOT_BODY = orjson.dumps({
         "message": "Welcome to ShopZone Ecommerce API", 
-        "version": os.getenv("APP_VERSION", "1.0.0"),
+        "version": APP_VERSION,
         "docs_url": "/docs",
         "redoc_url": "/redoc",
         "status": "running",
@@ -69,17 +106,10 @@ async def root():
         "import_error": IMPORT_ERROR if not IMPORTS_SUCCESS else None,
         "env_vars_valid": ENV_VARS_VALID,
         "missing_env_vars": missing_vars if not ENV_VARS_VALID else None,
-        "env_vars": {
-            "supabase_url": bool(os.getenv("SUPABASE_URL")),
-            "supabase_key": bool(os.getenv("SUPABASE_ANON_KEY")),
-            "jwt_secret": bool(os.getenv("JWT_SECRET_KEY"))
-        }
-    }
+        "env_vars": ENV_VARS_PRESENT
+    })
 
-@app.get("/api/v1/test")
-async def test_api():
-    """Test endpoint to verify API is working"""
-    return {
+_TEST_BODY = orjson.dumps({
         "message": "API is working!",
         "timestamp": "2025-01-02",
         "python_version": sys.version,
@@ -93,7 +123,45 @@ async def test_api():
             "auth": "/api/v1/auth",
             "health": "/health"
         }
-    }
+    })
+
+_HEALTHY_BODY = orjson.dumps({
+    "status": "healthy",
+    "database": "connected",
+    "timestamp": "2025-01-02",
+    "api_version": APP_VERSION
+})
+
+@app.get("/")
+async def root():
+    return _json_bytes_response(_ROOT_BODY)
+
+@app.get("/api/v1/test")
+async def test_api():
+    """Test endpoint to verify API is working"""
+    return _json_bytes_response(_TEST_BODY)
+
+# /health is polled by load balancers, so the database ping result is reused
+# for a few seconds instead of querying Supabase on every call
+HEALTH_PING_TTL = 10
+_last_ping = {"ts": float("-inf"), "ok": False, "error": None}
+_ping_lock = asyncio.Lock()
+
+async def _cached_db_ping() -> dict:
+    """Ping Supabase at most once per HEALTH_PING_TTL seconds and return the last result"""
+    if time.monotonic() - _last_ping["ts"] < HEALTH_PING_TTL:
+        return _last_ping
+    
+    async with _ping_lock:
+        # Concurrent callers wait for the ping already in flight
+        if time.monotonic() - _last_ping["ts"] >= HEALTH_PING_TTL:
+            try:
+                await asyncio.to_thread(ping_supabase)
+                _last_ping.update(ok=True, error=None)
+            except Exception as e:
+                _last_ping.update(ok=False, error=str(e))
+            _last_ping["ts"] = time.monotonic()
+    return _last_ping
 
 @app.get("/health")
 async def health_check():
@@ -113,27 +181,46 @@ async def health_check():
             "imports": "failed"
         }
     
+    # Test database connection (at most one real ping per HEALTH_PING_TTL)
+    ping = await _cached_db_ping()
+    if ping["ok"]:
+        return _json_bytes_response(_HEALTHY_BODY)
+    return {
+        "status": "unhealthy",
+        "database": "disconnected",
+        "error": ping["error"],
+        "timestamp": "2025-01-02"
+    }
+
+@app.get("/health/db")
+async def health_check_db():
+    """Ping Supabase over the shared connection pool and report the round-trip time"""
+    if not (IMPORTS_SUCCESS and ENV_VARS_VALID):
+        return {"status": "unhealthy", "database": "not configured"}
+    
     try:
-        # Test database connection
-        supabase = get_supabase_client()
-        # Simple query to test connection
-        test_response = supabase.table("users").select("id").limit(1).execute()
+        started = time.perf_counter()
+        await asyncio.to_thread(ping_supabase)
         return {
             "status": "healthy",
             "database": "connected",
-            "timestamp": "2025-01-02",
-            "api_version": os.getenv("APP_VERSION", "1.0.0")
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1)
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "database": "disconnected",
-            "error": str(e),
-            "timestamp": "2025-01-02"
+            "error": str(e)
         }
 
 # Include routers only if imports are successful and env vars are valid
 if IMPORTS_SUCCESS and ENV_VARS_VALID:
+    try:
+        # Build the shared Supabase client (and its connection pool) at cold start
+        get_supabase_client()
+    except Exception as e:
+        print(f"Supabase client warm-up error: {e}")
+    
     try:
         app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
         app.include_router(users.router, prefix="/api/v1/users", tags=["Users"])
@@ -149,4 +236,14 @@ handler = app
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop is not available on Windows; fall back to the default asyncio loop there.
+    # Workers need the app as an import string. WEB_CONCURRENCY adds workers, but the
+    # response caches are per process, so the default stays at one.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", 1))
+    )
\ No newline at end of file